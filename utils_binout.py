@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+BINOUT. Memory-mapped reader of epanet binary output files
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import mmap
+import numpy as np
+
+MAGIC = 516114521
+PROLOG_INTS = 15
+TITLE_SIZE = 3 * 80
+FILE_NAME_SIZE = 260
+PUMP_ENERGY_SIZE = 4 + 6*4
+EPILOG_SIZE = 7 * 4
+
+# ID SIZE (MAXID + 1) OF EPANET 2.2 AND 2.0 FILES
+ID_SIZES = [32, 16]
+
+NODE_VARIABLES = ['demand', 'head', 'pressure', 'quality']
+LINK_VARIABLES = ['flow', 'velocity', 'headloss', 'quality', 'status',
+                  'setting', 'reaction', 'friction']
+
+ENERGY_VARIABLES = ['utilization', 'efficiency', 'energy_per_volume',
+                    'average_power', 'peak_power', 'cost']
+
+# LINK STATUS CODES, THE LOWER ONES ARE CLOSED
+OPEN_STATUS = 3
+
+# LINK TYPE CODES, PIPES WITH CHECK VALVE AND PIPES, PUMPS AND VALVES
+PIPE_TYPE = 1
+PUMP_TYPE = 2
+
+# FLOW UNITS TO M3/S, CFS GPM MGD IMGD AFD (US) LPS LPM MLD CMH CMD (SI)
+FLOW_TO_CMS = [0.0283168, 6.30902E-5, 0.0438126, 0.0526168, 0.0142764,
+               1E-3, 1/60000, 1/86.4, 1/3600, 1/86400]
+US_UNITS = 4
+FEET = 0.3048
+
+
+class OutputFile:
+    '''Epanet binary output file (.out), memory-mapped.
+
+    Results are exposed as read-only NumPy views over the mapped file, so
+    no data is copied or read until it is used:
+    node_results: array, (periods, 4, nodes), NODE_VARIABLES
+    link_results: array, (periods, 8, links), LINK_VARIABLES
+    pump_energy: array, (pumps, 6), ENERGY_VARIABLES, run summary
+
+    Pipe headlosses are stored per 1000 length units, as epanet does.
+
+    Arguments
+    ---------
+    path: str, epanet binary output file
+    '''
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise Exception('Empty epanet output file!')
+        # EVERY VIEW DERIVES FROM THIS ONE, SO THE MAP IS NOT CLOSED UNDER THEM
+        self._data = np.frombuffer(self._mm, dtype=np.uint8)
+        try:
+            self._read()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _ints(self, offset, count):
+        '''Return count int32 values at offset.'''
+        return self._data[offset:offset + 4*count].view('<i4')
+
+    def _floats(self, offset, count):
+        '''Return count float32 values at offset.'''
+        return self._data[offset:offset + 4*count].view('<f4')
+
+    def _ids(self, offset, count, size):
+        '''Return count NUL terminated ids of size bytes at offset.'''
+        raw = self._mm[offset:offset + count*size]
+        return [raw[k*size:(k+1)*size].split(b'\0', 1)[0].decode('utf-8')
+                for k in range(count)]
+
+    def _read(self):
+        '''Read the prolog and the epilog and map the results.'''
+        size = len(self._mm)
+        if size < PROLOG_INTS*4 + EPILOG_SIZE:
+            raise Exception('Not an epanet output file!')
+        head = self._ints(0, PROLOG_INTS).tolist()
+        tail = self._ints(size - 3*4, 3).tolist()
+        if head[0] != MAGIC or tail[2] != MAGIC:
+            raise Exception('Not an epanet output file!')
+        (_, self.version, self.nnodes, self.ntanks, self.nlinks, self.npumps,
+         self.nvalves, self.quality_option, self.trace_node, self.flow_units,
+         self.pressure_units, self.statistics, self.report_start,
+         self.report_step, self.duration) = head
+        self.nperiods, self.warning = tail[0], tail[1]
+        nn, nl, nt = self.nnodes, self.nlinks, self.ntanks
+
+        # ID SIZE, FROM THE FILE SIZE
+        period_size = (4*nn + 8*nl) * 4
+        energy_size = self.npumps*PUMP_ENERGY_SIZE + 4
+        for id_size in ID_SIZES:
+            prolog_size = (PROLOG_INTS*4 + TITLE_SIZE + 2*FILE_NAME_SIZE
+                           + (2 + nn + nl)*id_size + 4*(nn + 5*nl + 2*nt))
+            if prolog_size + energy_size + self.nperiods*period_size \
+                    + EPILOG_SIZE == size:
+                break
+        else:
+            raise Exception('Unknown epanet output file layout!')
+
+        # PROLOG
+        offset = PROLOG_INTS*4
+        title = self._mm[offset:offset+TITLE_SIZE]
+        self.title = [title[k*80:(k+1)*80].split(b'\0', 1)[0].decode('utf-8',
+                                                                   'replace')
+                      for k in range(3)]
+        offset += TITLE_SIZE + 2*FILE_NAME_SIZE + 2*id_size
+        self.node_ids = self._ids(offset, nn, id_size)
+        offset += nn*id_size
+        self.link_ids = self._ids(offset, nl, id_size)
+        offset += nl*id_size
+        self.link_start = self._ints(offset, nl)
+        self.link_end = self._ints(offset + 4*nl, nl)
+        self.link_types = self._ints(offset + 8*nl, nl)
+        offset += 12*nl
+        self.tank_nodes = self._ints(offset, nt)
+        self.tank_areas = self._floats(offset + 4*nt, nt)
+        offset += 8*nt
+        self.elevations = self._floats(offset, nn)
+        self.lengths = self._floats(offset + 4*nn, nl)
+        self.diameters = self._floats(offset + 4*nn + 4*nl, nl)
+        offset += 4*nn + 8*nl
+
+        # PUMP ENERGY SUMMARY
+        records = self._data[offset:offset + self.npumps*PUMP_ENERGY_SIZE]
+        records = records.view([('link', '<i4'), ('values', '<f4', 6)])
+        self.pump_links = records['link'] - 1
+        self.pump_energy = records['values']
+
+        # RESULTS, VIEWS OVER THE MAPPED FILE
+        offset += energy_size
+        results = self._data[offset:offset + self.nperiods*period_size]
+        results = results.view('<f4').reshape(self.nperiods, period_size//4)
+        self.node_results = results[:, :4*nn].reshape(
+            self.nperiods, len(NODE_VARIABLES), nn)
+        self.link_results = results[:, 4*nn:].reshape(
+            self.nperiods, len(LINK_VARIABLES), nl)
+
+    def times(self):
+        '''Return the time, in seconds, of every reporting period.'''
+        return [self.report_start + k*self.report_step
+                for k in range(self.nperiods)]
+
+    def periods(self, start=None, end=None):
+        '''Return the reporting periods between two times in seconds.'''
+        return [k for k, t in enumerate(self.times())
+                if (start is None or t >= start) and (end is None or t <= end)]
+
+    def node_values(self, period, variable):
+        '''Return the view of a node variable at a period.'''
+        return self.node_results[period, NODE_VARIABLES.index(variable)]
+
+    def link_values(self, period, variable):
+        '''Return the view of a link variable at a period.'''
+        return self.link_results[period, LINK_VARIABLES.index(variable)]
+
+    def headlosses(self, period):
+        '''Return the absolute headloss of every link at a period.
+
+        Pipe headlosses are stored per 1000 length units, so they are
+        multiplied by the pipe length over 1000.
+        '''
+        values = self.link_values(period, 'headloss').astype(float)
+        pipes = self.link_types <= PIPE_TYPE
+        values[pipes] *= self.lengths[pipes] / 1000
+        return values
+
+    def power(self, period):
+        '''Return the power (kW) used by every link at a period.
+
+        The file does not store the pump power of every period, so it is
+        derived from the flow and the head gain with the average efficiency
+        of every pump in the run. Links other than pumps use no power.
+        '''
+        values = np.zeros(self.nlinks)
+        if not self.npumps:
+            return values
+        pumps = self.pump_links
+        flow = np.abs(self.link_values(period, 'flow')[pumps].astype(float))
+        head = np.abs(self.link_values(period, 'headloss')[pumps]
+                      .astype(float))
+        flow *= FLOW_TO_CMS[self.flow_units]
+        if self.flow_units <= US_UNITS:
+            head *= FEET
+        efficiency = self.pump_energy[:, ENERGY_VARIABLES.index(
+            'efficiency')] / 100
+        running = efficiency > 0
+        values[pumps[running]] = 9.81 * flow[running] * head[running] \
+            / efficiency[running]
+        return values
+
+    def close(self):
+        '''Release the views and close the file.'''
+        for name in ['link_start', 'link_end', 'link_types', 'tank_nodes',
+                     'tank_areas', 'elevations', 'lengths', 'diameters',
+                     'pump_links', 'pump_energy', 'node_results',
+                     'link_results', '_data']:
+            self.__dict__.pop(name, None)
+        try:
+            self._mm.close()
+        except BufferError:
+            # VIEWS HELD BY THE CALLER, THE MAP IS RELEASED WITH THEM
+            pass
+        self._file.close()
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+DEMAND. Assignment of point demands to network nodes
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from math import atan2, isfinite
+from .utils_grid import PointGrid, cell_size
+from .utils_segments import SegmentBuffer
+from .utils_tin import delaunay, _circumcircle
+
+CHUNK_SIZE = 5000
+EXACT_SHIFT = 1074
+
+# READ-ONLY TARGET INDEX OF EVERY WORKER
+_GRID = None
+
+
+def exact(value):
+    '''Return a float as an exact integer multiple of 2**-1074.'''
+    n, d = float(value).as_integer_ratio()
+    return n * ((1 << EXACT_SHIFT) // d)
+
+
+def demand_value(value):
+    '''Return an attribute as a float demand, NaN if it is NULL or text.'''
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def exact_to_float(total):
+    '''Return the float nearest to an exact sum of exact() values.'''
+    return total / (1 << EXACT_SHIFT)
+
+
+def prepare_workers():
+    '''Prepare multiprocessing to start python worker processes.
+
+    Inside QGIS sys.executable is the QGIS binary, not a python interpreter,
+    so spawned workers would relaunch QGIS. The interpreter of the python
+    prefix is used instead, pythonw.exe on Windows and bin/python3 on macOS.
+    Return False if workers can not be started, to run serially.
+    '''
+    if multiprocessing.get_start_method() == 'fork':
+        return True
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return True
+    if os.name == 'nt':
+        # QGIS EXECUTABLE IS NOT A PYTHON INTERPRETER
+        candidates = [os.path.join(sys.exec_prefix, 'pythonw.exe')]
+    else:
+        candidates = [os.path.join(sys.exec_prefix, 'bin', name)
+                      for name in ['python3', 'python']]
+    for python in candidates:
+        if os.path.exists(python):
+            multiprocessing.set_executable(python)
+            return True
+    return False
+
+
+def target_grid(targets):
+    '''Return a PointGrid of targets [(x, y), ..] labelled by index.'''
+    grid = PointGrid(cell_size(targets, 2))
+    for index, (x, y) in enumerate(targets):
+        grid.add(index, x, y)
+    return grid
+
+
+def _init_worker(targets):
+    '''Build the target index once per worker process.'''
+    global _GRID
+    _GRID = target_grid(targets)
+
+
+def _assign_chunk(chunk):
+    '''Assign a chunk of sources [(index, x, y, demands), ..].
+
+    Return (nearest, sums). Where:
+    nearest: list, [(source index, target index), ..]
+    sums: dict, {target index: [exact demand sum per field, ..]}
+    '''
+    nearest = []
+    sums = {}
+    for index, x, y, demands in chunk:
+        target = _GRID.nearest(x, y)[0]
+        nearest.append((index, target))
+        if target not in sums:
+            sums[target] = [0]*len(demands)
+        for k, demand in enumerate(demands):
+            if isfinite(demand):
+                sums[target][k] += exact(demand)
+    return nearest, sums
+
+
+def spatial_chunks(sources, size, chunk_size=CHUNK_SIZE):
+    '''Split sources [(x, y, demands), ..] into spatially sorted chunks.
+
+    Sources are ordered by the blocks of a coarse grid of cell size, so
+    every chunk covers a compact area. Every chunk is a list
+    [(source index, x, y, demands), ..].
+    '''
+    order = sorted(range(len(sources)),
+                   key=lambda i: (int(sources[i][0] // size),
+                                  int(sources[i][1] // size), i))
+    chunks = []
+    for start in range(0, len(order), chunk_size):
+        chunks.append([(i,) + tuple(sources[i])
+                       for i in order[start:start+chunk_size]])
+    return chunks
+
+
+def assign_nearest(targets, sources, workers=1, progress=None):
+    '''Assign every source to its nearest target and sum the demands.
+
+    Sources are split into spatial chunks. With several workers the chunks
+    are assigned in a process pool, every worker with its own copy of the
+    read-only target index. The per-target sums are exact, so the merge is
+    deterministic and the result is identical to the serial run. Ties are
+    broken by the lowest target index. Demands that are not finite (NaN or
+    infinite) are skipped.
+
+    Return (nearest, sums). Where:
+    nearest: list, target index of every source
+    sums: list, [[demand sum per field, ..], ..] of every target
+
+    Arguments
+    ---------
+    targets: list, [(x, y), ..]
+    sources: list, [(x, y, (demand1, ..)), ..]
+    workers: int, number of processes, 1 runs in this process
+    progress: callable, optional, called with the fraction of done chunks
+    '''
+    global _GRID
+    nfields = len(sources[0][2]) if sources else 0
+    grid = target_grid(targets)
+    chunks = spatial_chunks(sources, 32*grid.size)
+    if workers > 1 and len(chunks) > 1 and prepare_workers():
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker,
+                                       initargs=(targets,))
+        results = executor.map(_assign_chunk, chunks)
+    else:
+        executor = None
+        _GRID = grid
+        results = map(_assign_chunk, chunks)
+
+    # MERGE
+    nearest = [None]*len(sources)
+    totals = [[0]*nfields for _ in targets]
+    try:
+        for done, (chunk_nearest, chunk_sums) in enumerate(results):
+            for index, target in chunk_nearest:
+                nearest[index] = target
+            for target, values in chunk_sums.items():
+                for k, value in enumerate(values):
+                    totals[target][k] += value
+            if progress:
+                progress((done+1) / len(chunks))
+    finally:
+        if executor:
+            executor.shutdown()
+    sums = [[exact_to_float(value) for value in values] for values in totals]
+    return nearest, sums
+
+
+def assign_to_lines(lines, points):
+    '''Snap points to their nearest line and locate them along it.
+
+    The nearest segment is found with the grid index of a SegmentBuffer.
+    The demand of a point goes to the line start node times (1 - fraction)
+    and to the line end node times fraction.
+
+    Return a list [(line index, fraction, (x, y)), ..] for every point.
+    Where fraction is the chainage of the snapped point (x, y) over the line
+    length (0 for zero length lines). Points are not assigned, None, if
+    there is no line.
+
+    Arguments
+    ---------
+    lines: list, [[(x0, y0), .. (xn, yn)], ..]
+    points: list, [(x, y), ..]
+    '''
+    segments = SegmentBuffer(lines)
+    if not len(segments):
+        return [None]*len(points)
+    found = segments.nearest(points)
+    lengths = [0.0]*len(lines)
+    for line, chainage, length in zip(segments.line, segments.chainage,
+                                      segments.length):
+        lengths[line] = max(lengths[line], float(chainage + length))
+    result = []
+    for k in range(len(points)):
+        line = int(found['line'][k])
+        length = lengths[line]
+        fraction = float(found['chainage'][k]) / length if length else 0.0
+        xy = float(found['x'][k]), float(found['y'][k])
+        result.append((line, min(max(fraction, 0.0), 1.0), xy))
+    return result
+
+
+def clip_to_box(polygon, box):
+    '''Clip a convex polygon [(x, y), ..] to a box (x1, y1, x2, y2).'''
+    x1, y1, x2, y2 = box
+    edges = ((0, x1, 1), (0, x2, -1), (1, y1, 1), (1, y2, -1))
+    for axis, limit, sign in edges:
+        clipped = []
+        for k, current in enumerate(polygon):
+            previous = polygon[k-1]
+            inside = sign*(current[axis]-limit) >= 0
+            was_inside = sign*(previous[axis]-limit) >= 0
+            if inside != was_inside:
+                t = (limit-previous[axis]) / (current[axis]-previous[axis])
+                cut = [previous[0] + t*(current[0]-previous[0]),
+                       previous[1] + t*(current[1]-previous[1])]
+                cut[axis] = limit
+                clipped.append(tuple(cut))
+            if inside:
+                clipped.append(current)
+        polygon = clipped
+        if not polygon:
+            break
+    return polygon
+
+
+def voronoi_cells(points, box=None):
+    '''Return the Voronoi (Thiessen) cells of points [(x, y), ..].
+
+    The cells are built from the Delaunay triangulation, as the polygon of
+    the circumcenters of the triangles around every point, in O(n log n).
+    Four far points bound the cells of the convex hull points and all the
+    cells are clipped to a box.
+
+    Return a list of polygons [[(x, y), ..], ..], one per point. Duplicated
+    points get an empty cell.
+
+    Arguments
+    ---------
+    points: list, [(x, y), ..]
+    box: tuple, (x1, y1, x2, y2) clipping box, by default the extent of
+    the points enlarged 10 %
+    '''
+    if not points:
+        return []
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    if box is None:
+        dx = max(max(xs)-min(xs), max(ys)-min(ys), 1.0) * 0.1
+        box = (min(xs)-dx, min(ys)-dx, max(xs)+dx, max(ys)+dx)
+    x1, y1, x2, y2 = box
+    cx, cy = (x1+x2)/2, (y1+y2)/2
+    far = 10 * max(x2-x1, y2-y1, max(xs)-min(xs), max(ys)-min(ys), 1.0)
+    coords = [p[0:2] for p in points]
+    coords += [(cx-far, cy-far), (cx+far, cy-far),
+               (cx+far, cy+far), (cx-far, cy+far)]
+
+    # CIRCUMCENTERS AROUND EVERY POINT
+    around = [[] for _ in points]
+    for face in delaunay(coords):
+        vertices = [coords[v] for v in face]
+        center = _circumcircle(*vertices[0], *vertices[1], *vertices[2])[0]
+        for v in face:
+            if v < len(points):
+                around[v].append(center)
+
+    # SORT BY ANGLE AND CLIP
+    cells = []
+    for point, centers in zip(coords, around):
+        centers.sort(key=lambda c: atan2(c[1]-point[1], c[0]-point[0]))
+        cells.append(clip_to_box(centers, box) if len(centers) > 2 else [])
+    return cells
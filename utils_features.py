@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+FEATURES. Feature reading helpers for processing algorithms
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from time import perf_counter
+from qgis.core import QgsFeature, QgsFeatureRequest, QgsFeatureSink
+
+
+def attribute_rows(source, names):
+    '''Yield the values (value1, ..) of some attributes of every feature.
+
+    Geometries are not read and only the named attributes are fetched, so
+    topology passes over large layers are cheap. Read full features only
+    when they have to be written.
+
+    Arguments
+    ---------
+    source: QgsFeatureSource
+    names: list, attribute names, ['id', 'start', 'end']
+    '''
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes(names, source.fields())
+    indexes = [source.fields().lookupField(name) for name in names]
+    for name, index in zip(names, indexes):
+        if index < 0:
+            raise KeyError(name)
+    for f in source.getFeatures(request):
+        yield tuple(f.attribute(index) for index in indexes)
+
+
+class BufferedSink:
+    '''Feature sink writer by batches.
+
+    Features are copied into a batch and written with addFeatures and the
+    FastInsert flag every batch_size features, so file and database
+    outputs commit in large transactions. The sink may be None (optional
+    output not requested), then features are discarded.
+
+    Arguments
+    ---------
+    sink: QgsFeatureSink
+    name: str, output name used in the report
+    batch_size: int, features per batch
+    '''
+    BATCH_SIZE = 1000
+
+    def __init__(self, sink, name='Output', batch_size=BATCH_SIZE):
+        self.sink = sink
+        self.name = name
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __bool__(self):
+        return self.sink is not None
+
+    def addFeature(self, feature):
+        '''Add a copy of a feature to the batch.'''
+        if self.sink is None:
+            return False
+        self.batch.append(QgsFeature(feature))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        '''Write the pending features.'''
+        if self.batch:
+            start = perf_counter()
+            self.sink.addFeatures(self.batch, QgsFeatureSink.FastInsert)
+            self.seconds += perf_counter() - start
+            self.count += len(self.batch)
+            self.batch = []
+
+    def close(self, feedback=None):
+        '''Write the pending features and report the write throughput.
+
+        Only the time spent in addFeatures is counted, not the processing
+        between batches.
+        '''
+        if self.sink is None:
+            return
+        self.flush()
+        if feedback:
+            msg = '{}: {} features written in {:.2f} s ({:.0f} features/s).'
+            seconds = self.seconds
+            rate = self.count / seconds if seconds > 0 else self.count
+            feedback.pushInfo(msg.format(self.name, self.count, seconds, rate))
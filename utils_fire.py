@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+FIRE. Fire-flow simulation of hydrant pairs with the epanet toolkit
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import ctypes
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from .utils_demand import prepare_workers
+
+# EPANET TOOLKIT CONSTANTS
+EN_NODECOUNT = 0
+EN_BASEDEMAND = 1
+EN_PATTERN = 2
+EN_EMITTER = 3
+EN_DEMAND = 9
+EN_PRESSURE = 11
+EN_DURATION = 0
+EN_PATTERNSTEP = 3
+EN_PATTERNSTART = 4
+EN_DEMANDMULT = 4
+EN_JUNCTION = 0
+DEFAULT_PATTERN = b'1'
+NOSAVE = 0
+MAX_ERROR = 100     # lower codes are warnings
+
+# CASES SENT TO A WORKER AT ONCE, SMALL TO CANCEL SOON
+CHUNK_SIZE = 8
+
+# SEARCH OF THE AVAILABLE FLOW
+MAX_DOUBLINGS = 30
+FLOW_TOLERANCE = 1E-3
+
+# RELATIVE ERROR ALLOWED BETWEEN THE SIMULATED AND THE FIRE DEMAND
+DEMAND_TOLERANCE = 1E-3
+
+# EPANET MODEL OF EVERY WORKER
+_MODEL = None
+
+
+def load_library(lib_file):
+    '''Load the epanet toolkit library.'''
+    if os.name in ['nt', 'dos']:
+        return ctypes.windll.LoadLibrary(lib_file)
+    return ctypes.cdll.LoadLibrary(lib_file)
+
+
+class EpanetError(Exception):
+    '''Epanet toolkit error.'''
+    def __init__(self, code):
+        super().__init__('Epanet Toolkit error: {}!'.format(code))
+        self.code = code
+
+
+class FireFlowError(Exception):
+    '''Fire flow that can not be simulated at a hydrant.'''
+
+
+class FireModel:
+    '''Steady state epanet model, solved repeatedly with fire demands.
+
+    The legacy toolkit holds one project per library, so every process
+    has to open its own model. The demand of every junction without fire
+    flow is solved once, to check the fire demands.
+
+    Arguments
+    ---------
+    lib_file: str, epanet toolkit library
+    inp_file: str, base epanet model
+    '''
+    def __init__(self, lib_file, inp_file):
+        self.lib = load_library(lib_file)
+        handle, self.report_file = tempfile.mkstemp(suffix='.rpt')
+        os.close(handle)
+        self._call('ENopen', ctypes.c_char_p(inp_file.encode()),
+                   ctypes.c_char_p(self.report_file.encode()),
+                   ctypes.c_char_p(b''))
+        self._call('ENsettimeparam', EN_DURATION, ctypes.c_long(0))
+        self._call('ENopenH')
+        count = ctypes.c_int()
+        self._call('ENgetcount', EN_NODECOUNT, ctypes.byref(count))
+        self.junctions = []
+        node_type = ctypes.c_int()
+        for index in range(1, count.value+1):
+            self._call('ENgetnodetype', index, ctypes.byref(node_type))
+            if node_type.value == EN_JUNCTION:
+                self.junctions.append(index)
+
+        # DEMAND SCALING, AT THE START TIME
+        multiplier = ctypes.c_float()
+        self._call('ENgetoption', EN_DEMANDMULT, ctypes.byref(multiplier))
+        self.multiplier = multiplier.value
+        step, start = ctypes.c_long(), ctypes.c_long()
+        self._call('ENgettimeparam', EN_PATTERNSTEP, ctypes.byref(step))
+        self._call('ENgettimeparam', EN_PATTERNSTART, ctypes.byref(start))
+        self._period = start.value // max(step.value, 1)
+        self._factors = {}
+
+        # DEMANDS WITHOUT FIRE FLOW
+        self._call('ENinitH', NOSAVE)
+        time = ctypes.c_long()
+        self._call('ENrunH', ctypes.byref(time))
+        self.demands = {index: self.get(index, EN_DEMAND)
+                        for index in self.junctions
+                        if not self.get(index, EN_EMITTER)}
+
+    def _call(self, name, *args):
+        '''Call a toolkit function, raising errors but not warnings.'''
+        err = getattr(self.lib, name)(*args)
+        if err > MAX_ERROR:
+            raise EpanetError(err)
+
+    def index(self, node_id):
+        '''Return the index of a node id.'''
+        index = ctypes.c_int()
+        self._call('ENgetnodeindex', ctypes.c_char_p(str(node_id).encode()),
+                   ctypes.byref(index))
+        return index.value
+
+    def get(self, index, parameter):
+        '''Return a node value.'''
+        value = ctypes.c_float()
+        self._call('ENgetnodevalue', index, parameter, ctypes.byref(value))
+        return value.value
+
+    def set(self, index, parameter, value):
+        '''Set a node value.'''
+        self._call('ENsetnodevalue', index, parameter, ctypes.c_float(value))
+
+    def factor(self, index):
+        '''Return the scale of the base demand of a node at the start time.
+
+        Epanet multiplies the base demand by the pattern factor and by the
+        demand multiplier. Nodes without pattern use the default one.
+        '''
+        pattern = int(self.get(index, EN_PATTERN))
+        if pattern == 0:
+            default = ctypes.c_int()
+            if not self.lib.ENgetpatternindex(
+                    ctypes.c_char_p(DEFAULT_PATTERN), ctypes.byref(default)):
+                pattern = default.value
+        if pattern not in self._factors:
+            value = ctypes.c_float(1.0)
+            if pattern:
+                length = ctypes.c_int()
+                self._call('ENgetpatternlen', pattern, ctypes.byref(length))
+                period = self._period % max(length.value, 1)
+                self._call('ENgetpatternvalue', pattern, period+1,
+                           ctypes.byref(value))
+            self._factors[pattern] = value.value
+        return self._factors[pattern] * self.multiplier
+
+    def solve(self, hydrants, flow):
+        '''Solve the model with a fire flow added at every hydrant.
+
+        The fire flow is divided by the demand scale of every hydrant, so
+        the simulated demand is the normal demand plus the fire flow, and
+        it is checked at junctions without emitter.
+
+        Return the pressure at every hydrant and the minimum junction
+        pressure (pressure, index), (None, None) in a model without
+        junctions. Base demands are restored afterwards.
+        '''
+        base = [self.get(index, EN_BASEDEMAND) for index in hydrants]
+        try:
+            for index, demand in zip(hydrants, base):
+                factor = self.factor(index)
+                if not factor:
+                    msg = 'Demand of node {} is scaled to zero!'
+                    raise FireFlowError(msg.format(self.node_id(index)))
+                self.set(index, EN_BASEDEMAND, demand + flow/factor)
+            self._call('ENinitH', NOSAVE)
+            time = ctypes.c_long()
+            self._call('ENrunH', ctypes.byref(time))
+            for index in set(hydrants) & set(self.demands):
+                expected = self.demands[index] + flow
+                error = abs(self.get(index, EN_DEMAND) - expected)
+                if error > DEMAND_TOLERANCE*max(abs(expected), 1.0):
+                    msg = 'Fire demand of node {} is not simulated!'
+                    raise FireFlowError(msg.format(self.node_id(index)))
+            pressures = [self.get(index, EN_PRESSURE) for index in hydrants]
+            minimum = min(((self.get(index, EN_PRESSURE), index)
+                           for index in self.junctions),
+                          default=(None, None))
+        finally:
+            for index, demand in zip(hydrants, base):
+                self.set(index, EN_BASEDEMAND, demand)
+        return pressures, minimum
+
+    def available_flow(self, hydrants, flow, residual):
+        '''Return the fire flow per hydrant that lowers the weakest hydrant
+        to the residual pressure.
+
+        The flow is doubled from the design flow until the pressure falls
+        below the residual pressure and then bisected. A flow the solver
+        fails with is taken as not enough.
+        '''
+        def enough(value):
+            try:
+                return min(self.solve(hydrants, value)[0]) >= residual
+            except EpanetError:
+                return False
+
+        if not enough(0.0):
+            return 0.0
+        low, high = 0.0, max(flow, 1.0)
+        doublings = 0
+        while enough(high):
+            low, high = high, 2*high
+            doublings += 1
+            if doublings == MAX_DOUBLINGS:
+                return low
+        while high - low > FLOW_TOLERANCE*high:
+            middle = (low + high) / 2
+            if enough(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    def node_id(self, index):
+        '''Return the id of a node index.'''
+        id_ = ctypes.create_string_buffer(32)
+        self._call('ENgetnodeid', index, id_)
+        return id_.value.decode()
+
+    def close(self):
+        '''Close the model and remove the report file.'''
+        self.lib.ENcloseH()
+        self.lib.ENclose()
+        if os.path.exists(self.report_file):
+            os.remove(self.report_file)
+
+
+def _init_worker(lib_file, inp_file):
+    '''Open the epanet model once per worker process.'''
+    global _MODEL
+    _MODEL = FireModel(lib_file, inp_file)
+    Finalize(_MODEL, _MODEL.close, exitpriority=10)
+
+
+def _run_pair(case):
+    '''Run the fire-flow case (label, hydrant_1, hydrant_2, flow, residual).
+
+    Return (label, result). result is a dict with the hydrant pressures,
+    the minimum junction pressure and node and the available flow of the
+    pair, or with the error message.
+    '''
+    label, hydrant1, hydrant2, flow, residual = case
+    try:
+        hydrants = [_MODEL.index(hydrant1), _MODEL.index(hydrant2)]
+        pressures, (minimum, node) = _MODEL.solve(hydrants, flow)
+        node = None if node is None else _MODEL.node_id(node)
+        available = _MODEL.available_flow(hydrants, flow, residual)
+        return label, {'pressure_1': pressures[0],
+                       'pressure_2': pressures[1],
+                       'min_pressure': minimum,
+                       'min_node': node,
+                       'available': 2*available,
+                       'error': ''}
+    except (EpanetError, FireFlowError) as error:
+        return label, {'error': str(error)}
+
+
+def run_pairs(lib_file, inp_file, cases, workers=1, progress=None):
+    '''Run the fire-flow cases of hydrant pairs.
+
+    Every case is (label, hydrant_1 id, hydrant_2 id, fire flow per
+    hydrant, residual pressure). With several workers the cases run in a
+    process pool, every worker with its own epanet library and model.
+    Results are yielded as (label, result) in the order of the cases.
+    Closing the generator early cancels the cases not started yet.
+
+    Arguments
+    ---------
+    lib_file: str, epanet toolkit library
+    inp_file: str, base epanet model
+    cases: list, [(label, hydrant_1, hydrant_2, flow, residual), ..]
+    workers: int, number of processes, 1 runs in this process
+    progress: callable, optional, called with the fraction of done cases
+    '''
+    global _MODEL
+    if workers > 1 and len(cases) > 1 and prepare_workers():
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker,
+                                       initargs=(lib_file, inp_file))
+        chunksize = max(1, min(len(cases) // (4*workers), CHUNK_SIZE))
+        results = executor.map(_run_pair, cases, chunksize=chunksize)
+    else:
+        executor = None
+        _MODEL = FireModel(lib_file, inp_file)
+        results = map(_run_pair, cases)
+    finished = False
+    try:
+        for done, result in enumerate(results):
+            if progress:
+                progress((done+1) / len(cases))
+            yield result
+        finished = True
+    finally:
+        if executor and finished:
+            executor.shutdown()
+        elif executor:
+            # CANCELED OR FAILED, DROP THE QUEUED CASES
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            _MODEL.close()
+            _MODEL = None
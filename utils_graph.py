@@ -21,6 +21,9 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
+import heapq
+from math import hypot
+
 
 class Graph():
     """Define a graph as a dictionary of edges, {label: (start, end)}.
@@ -156,3 +159,71 @@ class Graph():
                     classified[label] = (graphtype, key)
         return classified
 
+
+def bounded_dijkstra(adjacency, source, cutoff):
+    """Return the distances {node: distance} from source to the nodes
+    reached within cutoff. adjacency is {node: [(node, weight), ..]}.
+    """
+    distances = {source: 0.0}
+    heap = [(0.0, 0, source)]
+    cnt = 1
+    done = set()
+    while heap:
+        dist, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        for other, weight in adjacency.get(node, []):
+            new = dist + weight
+            if new <= cutoff and new < distances.get(other, new+1):
+                distances[other] = new
+                heapq.heappush(heap, (new, cnt, other))
+                cnt += 1
+    return distances
+
+
+def network_pairs(linestrings, snapped, cutoff):
+    """Yield the pairs (i, j, distance), i < j, of points snapped to a
+    network of line strings, separated cutoff or less along the lines.
+
+    Line strings meet at coincident end vertices. Every point is a node
+    inserted in its line string, sorted by chainage, and a Dijkstra search
+    bounded by cutoff runs from every point, so the cost depends on the
+    size of the neighbourhoods and not on the number of points.
+
+    Arguments
+    ---------
+    linestrings: list, [[(x0, y0), .. (xn, yn)], ..]
+    snapped: list, [(line, chainage), ..] of every point, line is None
+    for points out of the network
+    cutoff: float, maximum distance along the lines
+    """
+    on_line = {}
+    for index, (line, chainage) in enumerate(snapped):
+        if line is not None:
+            on_line.setdefault(line, []).append((chainage, index))
+
+    # ADJACENCY. END VERTICES AND POINTS ALONG EVERY LINE STRING
+    adjacency = {}
+    for line, linestring in enumerate(linestrings):
+        if len(linestring) < 2:
+            continue
+        length = sum(hypot(b[0]-a[0], b[1]-a[1])
+                     for a, b in zip(linestring[:-1], linestring[1:]))
+        nodes = [(0.0, tuple(linestring[0][0:2]))]
+        nodes += [(min(max(c, 0.0), length), ('point', index))
+                  for c, index in sorted(on_line.get(line, []))]
+        nodes.append((length, tuple(linestring[-1][0:2])))
+        for (c1, n1), (c2, n2) in zip(nodes[:-1], nodes[1:]):
+            adjacency.setdefault(n1, []).append((n2, c2-c1))
+            adjacency.setdefault(n2, []).append((n1, c2-c1))
+
+    # BOUNDED SEARCH FROM EVERY POINT
+    for i in range(len(snapped)):
+        if snapped[i][0] is None:
+            continue
+        reached = bounded_dijkstra(adjacency, ('point', i), cutoff)
+        near = sorted((node[1], dist) for node, dist in reached.items()
+                      if node[0] == 'point' and node[1] > i)
+        for j, dist in near:
+            yield i, j, dist
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+GRID. Hash grid spatial index of points
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from math import ceil, floor, hypot, sqrt
+
+
+def cell_size(points, per_cell=1.0, minimum=0.0):
+    '''Return a cell size holding about per_cell points [(x, y), ..].'''
+    if not points:
+        return max(minimum, 1.0)
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    area = (max(xs)-min(xs)) * (max(ys)-min(ys))
+    size = (area * per_cell / len(points))**0.5
+    if size <= 0:
+        size = max(max(xs)-min(xs), max(ys)-min(ys), 1.0)
+    return max(size, minimum)
+
+
+class PointGrid:
+    '''Hash grid of labelled points, {(i, j): [(label, x, y), ..]}.
+
+    Labels are kept in insertion order inside every cell.
+    '''
+    def __init__(self, size):
+        if size <= 0:
+            raise Exception('Cell size must be positive.')
+        self.size = size
+        self.cells = {}
+        self._count = 0
+        self._bounds = None
+
+    def __len__(self):
+        return self._count
+
+    def key(self, x, y):
+        '''Return the cell key (i, j) of the point (x, y).'''
+        return int(floor(x / self.size)), int(floor(y / self.size))
+
+    def add(self, label, x, y):
+        '''Add a labelled point.'''
+        key = self.key(x, y)
+        self.cells.setdefault(key, []).append((label, x, y))
+        self._count += 1
+        if self._bounds is None:
+            self._bounds = key + key
+        else:
+            i1, j1, i2, j2 = self._bounds
+            self._bounds = (min(i1, key[0]), min(j1, key[1]),
+                            max(i2, key[0]), max(j2, key[1]))
+
+    def in_box(self, x1, y1, x2, y2):
+        '''Return the points [(label, x, y), ..] inside a box.'''
+        i1, j1 = self.key(x1, y1)
+        i2, j2 = self.key(x2, y2)
+        result = []
+        for i in range(i1, i2+1):
+            for j in range(j1, j2+1):
+                for item in self.cells.get((i, j), []):
+                    if x1 <= item[1] <= x2 and y1 <= item[2] <= y2:
+                        result.append(item)
+        return result
+
+    def in_radius(self, x, y, radius):
+        '''Return the points [(label, x, y), ..] within radius of (x, y).'''
+        box = self.in_box(x-radius, y-radius, x+radius, y+radius)
+        return [item for item in box
+                if hypot(item[1]-x, item[2]-y) <= radius]
+
+    def nearest(self, x, y):
+        '''Return the nearest point (label, x, y, distance) to (x, y).
+
+        Cells are visited in rings around the point, until no closer point
+        can be found. The first ring is the nearest one reaching the grid
+        bounds, so far points do not walk the empty rings. Ties are broken
+        by the lowest label. Return None if the grid is empty.
+        '''
+        if not self._count:
+            return None
+        i0, j0 = self.key(x, y)
+        i1, j1, i2, j2 = self._bounds
+        last = max(i0-i1, i2-i0, j0-j1, j2-j0)
+        best = None
+        ring = max(i1-i0, i0-i2, j1-j0, j0-j2, 0)
+        while ring <= last:
+            for key in _ring(i0, j0, ring, self._bounds):
+                for label, xk, yk in self.cells.get(key, []):
+                    dist = sqrt((xk-x)*(xk-x) + (yk-y)*(yk-y))
+                    if best is None or (dist, label) < (best[3], best[0]):
+                        best = (label, xk, yk, dist)
+            if best is not None and ring*self.size > best[3]:
+                break
+            ring += 1
+        return best
+
+    def near_segment(self, p1, p2, tol):
+        '''Return the points [(label, x, y), ..] within tol of a segment.
+
+        Only the cells along the segment, buffered by tol, are visited.
+        '''
+        dx, dy = p2[0]-p1[0], p2[1]-p1[1]
+        length = hypot(dx, dy)
+        reach = int(ceil((tol + self.size/4) / self.size))
+        steps = int(length // (self.size/2)) + 1
+        keys = set()
+        for step in range(steps+1):
+            t = step / steps
+            i, j = self.key(p1[0] + t*dx, p1[1] + t*dy)
+            for di in range(-reach, reach+1):
+                for dj in range(-reach, reach+1):
+                    keys.add((i+di, j+dj))
+        result = []
+        for key in keys:
+            for item in self.cells.get(key, []):
+                if _segment_distance(p1, p2, item[1:3]) <= tol:
+                    result.append(item)
+        return result
+
+
+def close_pairs(points, radius):
+    '''Yield the pairs (i, j, distance), i < j, of points [(x, y), ..]
+    separated radius or less.
+
+    Points are bucketed in a grid of cell size radius, so only the
+    neighbouring cells are compared. Pairs are yielded lazily, sorted by
+    i and then by j.
+    '''
+    grid = PointGrid(radius)
+    for label, (x, y) in enumerate(points):
+        grid.add(label, x, y)
+    for i, (x, y) in enumerate(points):
+        i0, j0 = grid.key(x, y)
+        near = []
+        for ci in range(i0-1, i0+2):
+            for cj in range(j0-1, j0+2):
+                for label, xk, yk in grid.cells.get((ci, cj), []):
+                    if label > i:
+                        dist = sqrt((xk-x)*(xk-x) + (yk-y)*(yk-y))
+                        if dist <= radius:
+                            near.append((label, dist))
+        near.sort()
+        for j, dist in near:
+            yield i, j, dist
+
+
+def _segment_distance(p1, p2, point):
+    '''Return the distance from point to the segment p1-p2.'''
+    dx, dy = p2[0]-p1[0], p2[1]-p1[1]
+    length2 = dx*dx + dy*dy
+    t = 0.0
+    if length2 > 0:
+        t = ((point[0]-p1[0])*dx + (point[1]-p1[1])*dy) / length2
+        t = min(max(t, 0.0), 1.0)
+    return hypot(p1[0] + t*dx - point[0], p1[1] + t*dy - point[1])
+
+
+def _ring(i0, j0, ring, bounds=None):
+    '''Yield the cell keys at Chebyshev distance ring of (i0, j0).
+
+    With bounds (i1, j1, i2, j2) only the keys inside them are yielded.
+    '''
+    if bounds is None:
+        inf = float('inf')
+        bounds = (-inf, -inf, inf, inf)
+    i1, j1, i2, j2 = bounds
+    if ring == 0:
+        if i1 <= i0 <= i2 and j1 <= j0 <= j2:
+            yield i0, j0
+        return
+    for j in (j0-ring, j0+ring):
+        if j1 <= j <= j2:
+            for i in range(max(i0-ring, i1), min(i0+ring, i2)+1):
+                yield i, j
+    for i in (i0-ring, i0+ring):
+        if i1 <= i <= i2:
+            for j in range(max(j0-ring+1, j1), min(j0+ring-1, j2)+1):
+                yield i, j
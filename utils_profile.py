@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+PROFILE. Line string profiles and high and low points
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from math import hypot
+
+
+def densify(linestring, interval):
+    '''Return the profile points [(x, y, chainage), ..] of a line string.
+
+    The points are the vertices and the points every interval along the
+    line string, sorted by chainage.
+    '''
+    points = []
+    if not linestring:
+        return points
+    x0, y0 = linestring[0][0:2]
+    points.append((x0, y0, 0.0))
+    chainage = 0.0
+    following = float(interval)
+    for vertex in linestring[1:]:
+        x1, y1 = vertex[0:2]
+        length = hypot(x1-x0, y1-y0)
+        while interval > 0 and following < chainage + length:
+            t = (following - chainage) / length
+            points.append((x0 + t*(x1-x0), y0 + t*(y1-y0), following))
+            following += interval
+        chainage += length
+        if length > 0:
+            points.append((x1, y1, chainage))
+        if following <= chainage:
+            following += interval
+        x0, y0 = x1, y1
+    return points
+
+
+def extremes(elevations, tolerance=0.0):
+    '''Return the high and low points [(index, 'HIGH' or 'LOW'), ..] of a
+    profile.
+
+    A point is a high (low) point if the profile rises (falls) more than
+    tolerance to it from the previous extreme or the start and then falls
+    (rises) more than tolerance before the next one or the end. Missing
+    elevations (None) are ignored.
+
+    Arguments
+    ---------
+    elevations: list, [z0, .. zn], sorted by chainage
+    tolerance: float, minimum elevation difference
+    '''
+    indexes = [i for i, z in enumerate(elevations) if z is not None]
+    result = []
+    if len(indexes) < 3:
+        return result
+    first = indexes[0]
+    high = low = first
+    trend = 0
+    for i in indexes[1:]:
+        z = elevations[i]
+        if trend == 0:
+            if z > elevations[high]:
+                high = i
+            if z < elevations[low]:
+                low = i
+            if elevations[high] - elevations[low] > tolerance:
+                if high > low:
+                    trend = 1
+                    if elevations[first] - elevations[low] > tolerance:
+                        result.append((low, 'LOW'))
+                else:
+                    trend = -1
+                    if elevations[high] - elevations[first] > tolerance:
+                        result.append((high, 'HIGH'))
+        elif trend == 1:
+            if z > elevations[high]:
+                high = i
+            elif elevations[high] - z > tolerance:
+                result.append((high, 'HIGH'))
+                trend = -1
+                low = i
+        else:
+            if z < elevations[low]:
+                low = i
+            elif z - elevations[low] > tolerance:
+                result.append((low, 'LOW'))
+                trend = 1
+                high = i
+    return result
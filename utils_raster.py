@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+RASTER. Block-wise interpolation of raster values at points
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from collections import OrderedDict
+import numpy as np
+
+BLOCK_SIZE = 512
+METHODS = ['nearest', 'bilinear', 'bicubic']
+
+# CELLS AROUND THE POINT CELL USED BY EVERY METHOD
+MARGIN = {'nearest': 0, 'bilinear': 1, 'bicubic': 2}
+
+
+def _cubic(t):
+    '''Return the four cubic convolution weights (a = -0.5) of offset t.'''
+    t2 = t*t
+    t3 = t2*t
+    return [(-t3 + 2*t2 - t) / 2,
+            (3*t3 - 5*t2 + 2) / 2,
+            (-3*t3 + 4*t2 + t) / 2,
+            (t3 - t2) / 2]
+
+
+def interpolate(values, valid, cols, rows, method='bilinear'):
+    '''Interpolate a block of raster values at points.
+
+    Cell (i, j) covers cols [j, j+1) and rows [i, i+1), so cell centres are
+    at j+0.5, i+0.5. A point is skipped if its own cell is out of the block
+    or has no data. If some cell of the interpolation stencil has no data
+    the nearest cell value is used.
+
+    Return (result, ok), arrays with the value and the success of every
+    point.
+
+    Arguments
+    ---------
+    values: array, (rows, cols) raster block
+    valid: array, (rows, cols) True where the block has data
+    cols, rows: array, fractional cell coordinates of the points
+    method: str, 'nearest', 'bilinear' or 'bicubic'
+    '''
+    height, width = values.shape
+    cols = np.asarray(cols, dtype=float)
+    rows = np.asarray(rows, dtype=float)
+    result = np.full(len(cols), np.nan)
+    ci = np.floor(cols).astype(np.int64)
+    ri = np.floor(rows).astype(np.int64)
+    ok = (ci >= 0) & (ci < width) & (ri >= 0) & (ri < height)
+    ok[ok] = valid[ri[ok], ci[ok]]
+    result[ok] = values[ri[ok], ci[ok]]
+    if method == 'nearest' or not ok.any():
+        return result, ok
+
+    # STENCIL
+    u = cols - 0.5
+    v = rows - 0.5
+    j0 = np.floor(u).astype(np.int64)
+    i0 = np.floor(v).astype(np.int64)
+    tu = u - j0
+    tv = v - i0
+    if method == 'bilinear':
+        offsets = [0, 1]
+        wu = [1 - tu, tu]
+        wv = [1 - tv, tv]
+    else:
+        offsets = [-1, 0, 1, 2]
+        wu = _cubic(tu)
+        wv = _cubic(tv)
+    total = np.zeros(len(cols))
+    complete = ok.copy()
+    for a, di in enumerate(offsets):
+        i = i0 + di
+        for b, dj in enumerate(offsets):
+            j = j0 + dj
+            inside = (j >= 0) & (j < width) & (i >= 0) & (i < height)
+            here = np.zeros(len(cols), dtype=bool)
+            here[inside] = valid[i[inside], j[inside]]
+            complete &= here
+            cell = np.zeros(len(cols))
+            cell[here] = values[i[here], j[here]]
+            total += wv[a] * wu[b] * cell
+    result[complete] = total[complete]
+    return result, ok
+
+
+def morton(i, j):
+    '''Return the Z-order (Morton) key of the non negative cell (i, j).'''
+    key = 0
+    bit = 0
+    while i or j:
+        key |= (j & 1) << (2*bit) | (i & 1) << (2*bit + 1)
+        i >>= 1
+        j >>= 1
+        bit += 1
+    return key
+
+
+class RasterSampler:
+    '''Sample a raster at many points reading it in cached blocks.
+
+    The raster is read in fixed blocks of block_size cells, kept in a LRU
+    cache limited by a memory budget. Points are grouped by block and the
+    blocks are visited in Z-order. Every group reads the window of its
+    point stencils, so a neighbour block is read only if some stencil
+    crosses into it, and it is usually still cached. I/O is roughly
+    proportional to the covered area.
+
+    Arguments
+    ---------
+    read: callable, read(col1, row1, col2, row2) returns (values, valid)
+    arrays of the window [row1:row2, col1:col2]
+    width, height: int, raster size in cells
+    method: str, 'nearest', 'bilinear' or 'bicubic'
+    block_size: int, block side in cells
+    budget: int, block cache memory budget in bytes, default 256 MB
+    '''
+    def __init__(self, read, width, height, method='bilinear',
+                 block_size=BLOCK_SIZE, budget=256*2**20):
+        if method not in METHODS:
+            raise Exception('Unknown interpolation method: {}.'.format(method))
+        self.read = read
+        self.width = width
+        self.height = height
+        self.method = method
+        self.block_size = block_size
+        self.budget = budget
+        self._cache = OrderedDict()
+        self._used = 0
+        self.reads = 0
+
+    def block(self, bi, bj):
+        '''Return the (values, valid) arrays of a block, using the cache.'''
+        key = (bi, bj)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        size = self.block_size
+        values, valid = self.read(bj*size, bi*size,
+                                  min((bj+1)*size, self.width),
+                                  min((bi+1)*size, self.height))
+        self.reads += 1
+        self._cache[key] = (values, valid)
+        self._used += values.nbytes + valid.nbytes
+        while self._used > self.budget and len(self._cache) > 1:
+            _, (old, old_valid) = self._cache.popitem(last=False)
+            self._used -= old.nbytes + old_valid.nbytes
+        return values, valid
+
+    def window(self, col1, row1, col2, row2):
+        '''Return the (values, valid) arrays of a window, from the blocks.'''
+        values = np.zeros((row2-row1, col2-col1))
+        valid = np.zeros((row2-row1, col2-col1), dtype=bool)
+        size = self.block_size
+        for bi in range(row1 // size, (row2-1) // size + 1):
+            for bj in range(col1 // size, (col2-1) // size + 1):
+                block, block_valid = self.block(bi, bj)
+                r1, c1 = max(row1, bi*size), max(col1, bj*size)
+                r2 = min(row2, bi*size + block.shape[0])
+                c2 = min(col2, bj*size + block.shape[1])
+                target = (slice(r1-row1, r2-row1), slice(c1-col1, c2-col1))
+                source = (slice(r1-bi*size, r2-bi*size),
+                          slice(c1-bj*size, c2-bj*size))
+                values[target] = block[source]
+                valid[target] = block_valid[source]
+        return values, valid
+
+    def blocks(self, cols, rows):
+        '''Return the points of every block {(bi, bj): indexes}.'''
+        ci = np.floor(cols).astype(np.int64)
+        ri = np.floor(rows).astype(np.int64)
+        inside = np.flatnonzero((ci >= 0) & (ci < self.width)
+                                & (ri >= 0) & (ri < self.height))
+        if not len(inside):
+            return {}
+        nbj = (self.width - 1) // self.block_size + 1
+        keys = (ri[inside] // self.block_size) * nbj \
+            + ci[inside] // self.block_size
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        inside = inside[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        groups = {}
+        for start, end in zip(starts, ends):
+            key = int(keys[start])
+            groups[(key // nbj, key % nbj)] = inside[start:end]
+        return groups
+
+    def sample(self, cols, rows, progress=None):
+        '''Return (values, ok) arrays at fractional cell coordinates.
+
+        Arguments
+        ---------
+        cols, rows: array, fractional cell coordinates from the top left
+        corner of the raster
+        progress: callable, optional, called with the fraction of done
+        blocks
+        '''
+        cols = np.asarray(cols, dtype=float)
+        rows = np.asarray(rows, dtype=float)
+        result = np.full(len(cols), np.nan)
+        ok = np.zeros(len(cols), dtype=bool)
+        margin = MARGIN[self.method]
+        groups = self.blocks(cols, rows)
+        order = sorted(groups, key=lambda key: morton(*key))
+        for done, (bi, bj) in enumerate(order):
+            indexes = groups[(bi, bj)]
+
+            # WINDOW OF THE STENCILS, NEIGHBOUR BLOCKS ONLY IF CROSSED
+            ci = np.floor(cols[indexes]).astype(np.int64)
+            ri = np.floor(rows[indexes]).astype(np.int64)
+            c1 = max(int(ci.min()) - margin, 0)
+            r1 = max(int(ri.min()) - margin, 0)
+            c2 = min(int(ci.max()) + margin + 1, self.width)
+            r2 = min(int(ri.max()) + margin + 1, self.height)
+            values, valid = self.window(c1, r1, c2, r2)
+            found, found_ok = interpolate(values, valid, cols[indexes] - c1,
+                                          rows[indexes] - r1, self.method)
+            result[indexes] = found
+            ok[indexes] = found_ok
+            if progress:
+                progress((done+1) / len(order))
+        return result, ok
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+SEGMENTS. Vectorized point to line string projection
+Andrés García Martínez (ppnoptimizer@gmail.com)
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from math import floor, hypot, inf
+import numpy as np
+from .utils_grid import _ring
+
+CHUNK_SIZE = 2**22
+BLOCK_POINTS = 64
+LONG_EDGES = 64
+
+
+class SegmentBuffer:
+    """Flat coordinate buffer of many line strings.
+
+    Vertices of all line strings are stored in one (n, 2) array and
+    offsets[k]:offsets[k+1] are the vertices of the line string k.
+
+    Arguments
+    ---------
+    linestrings: list, [[(x0, y0), .. (xn, yn)], ..]
+    """
+    def __init__(self, linestrings):
+        sizes = [len(line) for line in linestrings]
+        self.offsets = np.zeros(len(sizes)+1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(sizes)
+        self.coords = np.zeros((self.offsets[-1], 2))
+        for k, line in enumerate(linestrings):
+            if line:
+                start = self.offsets[k]
+                self.coords[start:start+len(line)] = [v[0:2] for v in line]
+
+        # SEGMENTS. START VERTEX, LINE, LOCAL INDEX AND CHAINAGE
+        vertex_line = np.repeat(np.arange(len(sizes)), sizes)
+        last = np.zeros(len(self.coords), dtype=bool)
+        last[self.offsets[1:][np.array(sizes, dtype=np.int64) > 0] - 1] = True
+        self.start = np.flatnonzero(~last)
+        self.line = vertex_line[self.start]
+        self.index = self.start - self.offsets[self.line]
+        self.p1 = self.coords[self.start]
+        self.delta = self.coords[self.start+1] - self.p1
+        self.length = np.hypot(self.delta[:, 0], self.delta[:, 1])
+        cumulative = np.concatenate(([0.0], np.cumsum(self.length)))
+        first = np.searchsorted(self.line, self.line, side='left')
+        self.chainage = cumulative[:-1] - cumulative[first]
+        self._cells = None
+        self._size = None
+        self._bounds = None
+        self._segments = None
+
+    def __len__(self):
+        return len(self.start)
+
+    def project(self, points, segments=None):
+        """Project points onto their nearest segment.
+
+        Return a dict of arrays, one value per point:
+        'line': line string index
+        'segment': segment index inside its line string
+        'x', 'y': projected point
+        'chainage': distance along the line string to the projected point
+        'distance': distance from the point to the projected point
+
+        The first segment, in buffer order, wins ties.
+
+        Arguments
+        ---------
+        points: array like, [(x, y), ..]
+        segments: array like, optional, candidate segment positions in the
+        buffer, by default all of them
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if segments is None:
+            segments = np.arange(len(self))
+        segments = np.asarray(segments, dtype=np.int64)
+        result = _empty_result(len(points))
+        if not len(points) or not len(segments):
+            return result
+        p1 = self.p1[segments]
+        delta = self.delta[segments]
+        length2 = self.length[segments]**2
+        safe = np.where(length2 > 0, length2, 1.0)
+
+        # POINT CHUNKS, BOUNDING THE (POINTS, SEGMENTS) MATRICES
+        step = max(1, CHUNK_SIZE // len(segments))
+        for i in range(0, len(points), step):
+            chunk = points[i:i+step]
+            dx = chunk[:, 0, None] - p1[None, :, 0]
+            dy = chunk[:, 1, None] - p1[None, :, 1]
+            t = (dx*delta[None, :, 0] + dy*delta[None, :, 1]) / safe
+            t = np.where(length2 > 0, np.clip(t, 0.0, 1.0), 0.0)
+            ex = dx - t*delta[None, :, 0]
+            ey = dy - t*delta[None, :, 1]
+            dist = np.hypot(ex, ey)
+            best = np.argmin(dist, axis=1)
+            rows = np.arange(len(chunk))
+            seg = segments[best]
+            tb = t[rows, best]
+            result['line'][i:i+step] = self.line[seg]
+            result['segment'][i:i+step] = self.index[seg]
+            result['x'][i:i+step] = self.p1[seg, 0] + tb*self.delta[seg, 0]
+            result['y'][i:i+step] = self.p1[seg, 1] + tb*self.delta[seg, 1]
+            result['chainage'][i:i+step] = self.chainage[seg] + tb*self.length[seg]
+            result['distance'][i:i+step] = dist[rows, best]
+        return result
+
+    def build_index(self, size=None):
+        """Bucket the segments in a hash grid by their bounding boxes.
+
+        Arguments
+        ---------
+        size: float, cell size, by default the mean segment length
+        """
+        if size is None:
+            size = float(self.length.mean()) if len(self) else 1.0
+        self._size = max(size, 1E-9)
+        p2 = self.p1 + self.delta
+        low = np.floor(np.minimum(self.p1, p2) / self._size).astype(np.int64)
+        high = np.floor(np.maximum(self.p1, p2) / self._size).astype(np.int64)
+        self._cells = {}
+        for position in range(len(self)):
+            for i in range(low[position, 0], high[position, 0]+1):
+                for j in range(low[position, 1], high[position, 1]+1):
+                    self._cells.setdefault((i, j), []).append(position)
+        if len(self):
+            self._bounds = (int(low[:, 0].min()), int(low[:, 1].min()),
+                            int(high[:, 0].max()), int(high[:, 1].max()))
+        self._segments = list(zip(self.p1[:, 0].tolist(),
+                                  self.p1[:, 1].tolist(),
+                                  self.delta[:, 0].tolist(),
+                                  self.delta[:, 1].tolist(),
+                                  (self.length**2).tolist()))
+
+    def nearest(self, points):
+        """Project points onto their nearest segment, using the grid index.
+
+        Points are grouped by blocks of cells and projected onto the
+        segments of the surrounding cells. The neighbourhood grows ring by ring until the
+        found segment is closer than the ring radius, so the result is the
+        same as project(points).
+        """
+        if self._cells is None:
+            self.build_index()
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        result = _empty_result(len(points))
+        if not len(points) or not self._cells:
+            return result
+        keys = np.floor(points / self._size).astype(np.int64)
+        low, high = self._bounds[0:2], self._bounds[2:4]
+
+        # GROUP POINTS IN BLOCKS OF CELLS, ABOUT BLOCK_POINTS POINTS EACH
+        density = len(points) / len(np.unique(keys, axis=0))
+        block = max(1, int((BLOCK_POINTS / density)**0.5))
+        groups = {}
+        for index, key in enumerate(map(tuple, keys // block)):
+            groups.setdefault(key, []).append(index)
+        for (bi, bj), indexes in groups.items():
+            pending = np.array(indexes)
+            i1, j1 = bi*block, bj*block
+            i2, j2 = i1+block-1, j1+block-1
+            last = max(i2-low[0], high[0]-i1, j2-low[1], high[1]-j1)
+            gap = max(low[0]-i2, i1-high[0], low[1]-j2, j1-high[1])
+            ring = max(1, gap)
+            while len(pending):
+                if ring >= last:
+                    candidates = None
+                else:
+                    candidates = set()
+                    for i in range(i1-ring, i2+ring+1):
+                        for j in range(j1-ring, j2+ring+1):
+                            candidates.update(self._cells.get((i, j), []))
+                    if not candidates:
+                        ring *= 2
+                        continue
+                    candidates = sorted(candidates)
+                found = self.project(points[pending], candidates)
+                if candidates is None:
+                    done = np.ones(len(pending), dtype=bool)
+                else:
+                    done = found['distance'] <= ring*self._size
+                for key, value in found.items():
+                    result[key][pending[done]] = value[done]
+                pending = pending[~done]
+                ring *= 2
+        return result
+
+    def nearest_point(self, x, y):
+        """Return (distance, position, (x, y)) of the nearest segment.
+
+        Single point version of nearest, without numpy arrays. The cells are
+        visited ring by ring, starting at the ring of the grid bounds, until
+        no unvisited segment can be closer. position is the segment position
+        in the buffer, the first one wins ties, and (x, y) the projected
+        point. Return (inf, -1, None) if there are no segments.
+        """
+        if self._cells is None:
+            self.build_index()
+        best = (inf, -1, 0.0)
+        if not self._cells:
+            return inf, -1, None
+        i0, j0 = int(floor(x / self._size)), int(floor(y / self._size))
+        i1, j1, i2, j2 = self._bounds
+        last = max(i0-i1, i2-i0, j0-j1, j2-j0)
+        ring = max(i1-i0, i0-i2, j1-j0, j0-j2, 0)
+        segments = self._segments
+        while ring <= last:
+            for key in _ring(i0, j0, ring, self._bounds):
+                for position in self._cells.get(key, ()):
+                    x1, y1, dx, dy, length2 = segments[position]
+                    ex, ey = x-x1, y-y1
+                    t = 0.0
+                    if length2 > 0:
+                        t = min(max((ex*dx + ey*dy) / length2, 0.0), 1.0)
+                    distance = hypot(ex - t*dx, ey - t*dy)
+                    if (distance, position) < best[0:2]:
+                        best = (distance, position, t)
+            if best[0] < ring*self._size:
+                break
+            ring += 1
+        distance, position, t = best
+        x1, y1, dx, dy = segments[position][0:4]
+        return distance, position, (x1 + t*dx, y1 + t*dy)
+
+    def segments_of(self, lines):
+        """Return the buffer positions of the segments of some line strings."""
+        return np.flatnonzero(np.isin(self.line, np.asarray(lines)))
+
+
+class FeatureEdges:
+    """Edges of one line or polygon feature, for point distance queries.
+
+    Long features (LONG_EDGES segments or more) are projected through an
+    indexed SegmentBuffer, short ones through a plain loop.
+
+    Arguments
+    ---------
+    linestrings: list, polyline parts or polygon rings
+    polygon: bool, the line strings are closed rings of a polygon, so
+    points inside are at distance zero
+    """
+    def __init__(self, linestrings, polygon=False):
+        self.linestrings = [[v[0:2] for v in line] for line in linestrings]
+        self.polygon = polygon
+        self.buffer = None
+        if sum(max(len(line)-1, 0) for line in self.linestrings) >= LONG_EDGES:
+            self.buffer = SegmentBuffer(self.linestrings)
+            self.buffer.build_index()
+
+    def contains(self, point):
+        """Return True if the point is inside the rings (even-odd rule)."""
+        x, y = point
+        inside = False
+        for ring in self.linestrings:
+            for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+                if (y1 > y) != (y2 > y):
+                    if x < x1 + (y-y1)*(x2-x1)/(y2-y1):
+                        inside = not inside
+        return inside
+
+    def nearest(self, point):
+        """Return the distance and the nearest point of the feature.
+
+        Arguments
+        ---------
+        point: tuple, (x, y)
+        """
+        x, y = point[0:2]
+        if self.polygon and self.contains((x, y)):
+            return 0.0, (x, y)
+        if self.buffer is not None:
+            distance, position, xy = self.buffer.nearest_point(x, y)
+            return distance, xy
+        best = (inf, None)
+        for line in self.linestrings:
+            if len(line) == 1:
+                candidates = [(line[0], line[0])]
+            else:
+                candidates = zip(line[:-1], line[1:])
+            for (x1, y1), (x2, y2) in candidates:
+                dx, dy = x2-x1, y2-y1
+                length2 = dx*dx + dy*dy
+                t = 0.0
+                if length2 > 0:
+                    t = min(max(((x-x1)*dx + (y-y1)*dy) / length2, 0.0), 1.0)
+                px, py = x1 + t*dx, y1 + t*dy
+                distance = hypot(x-px, y-py)
+                if distance < best[0]:
+                    best = (distance, (px, py))
+        return best
+
+
+def _empty_result(n):
+    """Return the projection arrays of n points, not found yet."""
+    return {
+        'line': np.full(n, -1, dtype=np.int64),
+        'segment': np.full(n, -1, dtype=np.int64),
+        'x': np.full(n, np.nan),
+        'y': np.full(n, np.nan),
+        'chainage': np.full(n, np.nan),
+        'distance': np.full(n, np.inf)
+        }
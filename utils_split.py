@@ -20,7 +20,8 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
-from math import copysign
+from math import copysign, hypot
+from .utils_grid import PointGrid, cell_size, _segment_distance
 
 def split_linestring(linestring, point, tol=0.0):
     """Split a line string at point.
@@ -87,12 +88,83 @@ def split_linestring(linestring, point, tol=0.0):
     # SPLITTING POINT NOT FOUND
     return None
 
+def locate_point(linestring, point, tol=0.0, chainages=None):
+    """Locate a splitting point on a line string.
+
+    The first segment passing within tol of the point is used, with the same
+    rules as split_linestring: points within tol of a segment end are
+    snapped to the vertex and points at the line start or end are ignored.
+    An ignored start or end does not stop the search, so a point shared by
+    the ends and a later vertex of a closed or self-overlapping line is
+    still found there.
+
+    Return
+    If the point splits the line: (chainage, index, coordinates). Where
+    index is the vertex index, when snapped, otherwise the segment index
+    and coordinates is the projected point, (Xs, Ys), or None for vertices;
+    otherwise: None.
+
+    Arguments
+    ---------
+    linestring: list, [(X0, Y0).. (Xn, Yn)] line string
+    point: tuple, (Xs, Ys) splitting point coordinates
+    tol: float, tolerance distance
+    chainages: list, cumulative length at every vertex, computed if None
+    """
+    if chainages is None:
+        chainages = linestring_chainages(linestring)
+
+    # SEGMENT LOOP
+    n = len(linestring)-1
+    for i in range(n):
+        xs, ys = linestring[i][0:2]
+        x1e, y1e = linestring[i+1][0]-xs, linestring[i+1][1]-ys
+        b = chainages[i+1] - chainages[i]
+
+        # IGNORE TOO SHORT SEGMENT
+        if b <= tol:
+            continue
+        cteta, steta = x1e/b, y1e/b
+        x1p, y1p = point[0]-xs, point[1]-ys
+        d = -x1p*steta + y1p*cteta
+        a = x1p*cteta + y1p*steta
+
+        # DETECT PROXIMITY
+        if abs(d) <= tol:
+            if -tol <= a <= tol:
+                if i == 0:
+                    continue # IGNORE INTERSECTION AT START POINT
+                return (chainages[i], i, None)
+            if b-tol <= a <= b+tol:
+                if i == n-1:
+                    continue # IGNORE INTERSECTION AT END POINT
+                return (chainages[i+1], i+1, None)
+            if tol < a < b-tol:
+                return (chainages[i]+a, i, (xs + a*cteta, ys + a*steta))
+
+    # SPLITTING POINT NOT FOUND
+    return None
+
+def linestring_chainages(linestring):
+    """Return the cumulative length at every vertex of a line string."""
+    chainages = [0.0]
+    for i in range(len(linestring)-1):
+        dx = linestring[i+1][0]-linestring[i][0]
+        dy = linestring[i+1][1]-linestring[i][1]
+        chainages.append(chainages[-1] + hypot(dx, dy))
+    return chainages
+
 def split_linestring_m(linestring, points, tol=0.0):
     """Return a list of linestring parts splitted by points.
 
     The result is a list of list containing the linestring parts.
     [[initial_point, ..., first_division], ..., [last_division, final_point]]
 
+    Every point is projected once onto the line string. The splitting
+    locations are sorted by chainage and the line is cut in a single pass,
+    so the result does not depend on the point order. Locations closer than
+    tol to the previous cut or to the line end are ignored.
+
     Arguments
     ---------
     linestring: list, [(x,y), ..]
@@ -102,22 +174,252 @@ def split_linestring_m(linestring, points, tol=0.0):
     
     """
 
-    # INITIALIZE RESULT LINES
-    result = [linestring.copy()]
-
-    # POINTS LOOP
+    # LOCATE POINTS
+    chainages = linestring_chainages(linestring)
+    cuts = []
     for point in points:
+        location = locate_point(linestring, point, tol, chainages)
+        if location:
+            cuts.append(location)
+    return cut_linestring(linestring, cuts, tol, chainages)
 
-        # LINESTRINGS LOOP
-        for index, line in enumerate(result):
-            # SPLIT
-            splitted = split_linestring(line, point, tol)
+def cut_linestring(linestring, cuts, tol=0.0, chainages=None):
+    """Return the parts of a line string cut at located points.
 
-            # CHANGE OLD LINE AND ADD NEW
-            if splitted:
-                result[index] = splitted[0]
-                result.insert(index+1, splitted[1])
-                break
+    Cuts are sorted by chainage and the line is cut in a single pass. Cuts
+    closer than tol to the previous cut or to the line ends are ignored.
+
+    Arguments
+    ---------
+    linestring: list, [(x,y), ..]
+    cuts: list, [(chainage, index, coordinates), ..] as locate_point
+    tol: float, tolerance distance
+    chainages: list, cumulative length at every vertex, computed if None
+    """
+    if chainages is None:
+        chainages = linestring_chainages(linestring)
+    cuts = sorted(cuts, key=lambda cut: cut[0])
+
+    # CUT IN A SINGLE PASS
+    result = []
+    part = [linestring[0]]
+    last = 0.0
+    pos = 1
+    for chainage, index, xy in cuts:
+        if chainage - last <= tol or chainages[-1] - chainage <= tol:
+            continue
+        if xy is None:
+            # SPLIT AT VERTEX
+            part.extend(linestring[pos:index+1])
+            result.append(part)
+            part = [linestring[index]]
+        else:
+            # SPLIT AT SEGMENT
+            part.extend(linestring[pos:index+1])
+            part.append(xy)
+            result.append(part)
+            part = [xy]
+        pos = index+1
+        last = chainage
+    part.extend(linestring[pos:])
+    result.append(part)
 
     # RETURN RESULT
     return result
+
+def merge_points(points, tol=0.0):
+    """Filter overlapped points, in linear expected time.
+
+    Points are processed in order. A point closer than tol (or at tol) to
+    a kept point is merged into the nearest one, otherwise it is kept.
+    Kept points are indexed in a hash grid of cell size tol, so only the
+    neighbouring cells are checked.
+
+    Return (kept, clusters). Where:
+    kept: list, indexes of the kept points
+    clusters: dict, {kept index: [merged index, ..]} of the merged clusters
+
+    Arguments
+    ---------
+    points: list, [(x, y), ..]
+    tol: float, tolerance distance
+    """
+    grid = PointGrid(max(tol, 1E-9))
+    kept = []
+    clusters = {}
+    for index, point in enumerate(points):
+        x, y = point[0:2]
+        nearest = None
+        for label, xk, yk in grid.in_radius(x, y, tol):
+            dist = hypot(x-xk, y-yk)
+            if nearest is None or (dist, label) < nearest:
+                nearest = (dist, label)
+        if nearest is None:
+            grid.add(index, x, y)
+            kept.append(index)
+        else:
+            clusters.setdefault(nearest[1], []).append(index)
+    return kept, clusters
+
+def _cross(ax, ay, bx, by):
+    """Return the cross product of two vectors."""
+    return ax*by - ay*bx
+
+def _segment_nodes(p1, p2, q1, q2, ends, tol):
+    """Return the noding points between the segments p1-p2 and q1-q2.
+
+    Return a list of (point, side, t) where side 0 splits the first segment
+    line string and 1 the second one, and t is the parameter of the point
+    along the split segment.
+
+    Arguments
+    ---------
+    ends: tuple, (p1, p2, q1, q2) flags, True if the vertex is a line end
+    """
+    result = []
+
+    # CROSSING
+    rx, ry = p2[0]-p1[0], p2[1]-p1[1]
+    sx, sy = q2[0]-q1[0], q2[1]-q1[1]
+    denom = _cross(rx, ry, sx, sy)
+    if denom:
+        wx, wy = q1[0]-p1[0], q1[1]-p1[1]
+        t = _cross(wx, wy, sx, sy) / denom
+        u = _cross(wx, wy, rx, ry) / denom
+        if 0 <= t <= 1 and 0 <= u <= 1:
+            point = (p1[0] + t*rx, p1[1] + t*ry)
+            result.append((point, 0, t))
+            result.append((point, 1, u))
+
+    # LINE ENDS NEAR THE OTHER SEGMENT (T-JUNCTIONS)
+    for vertex, end, side, a, b in ((p1, ends[0], 1, q1, q2),
+                                    (p2, ends[1], 1, q1, q2),
+                                    (q1, ends[2], 0, p1, p2),
+                                    (q2, ends[3], 0, p1, p2)):
+        if end and _segment_distance(a, b, vertex) <= tol:
+            dx, dy = b[0]-a[0], b[1]-a[1]
+            length2 = dx*dx + dy*dy
+            t = 0.0
+            if length2 > 0:
+                t = ((vertex[0]-a[0])*dx + (vertex[1]-a[1])*dy) / length2
+                t = min(max(t, 0.0), 1.0)
+            result.append((vertex, side, t))
+    return result
+
+def _segment_location(linestring, chainages, i, t, tol):
+    """Return the cut (chainage, index, coordinates) at parameter t of the
+    segment i, snapped to the segment vertices within tol."""
+    length = chainages[i+1] - chainages[i]
+    a = t*length
+    if a <= tol:
+        return (chainages[i], i, None)
+    if length - a <= tol:
+        return (chainages[i+1], i+1, None)
+    (x1, y1), (x2, y2) = linestring[i][0:2], linestring[i+1][0:2]
+    return (chainages[i]+a, i, (x1 + t*(x2-x1), y1 + t*(y2-y1)))
+
+def node_linestrings(linestrings, tol=0.0):
+    """Split line strings at their crossings and T-junctions.
+
+    Segments are bucketed in a hash grid and only the segments sharing a
+    cell are intersected. A line string is split where it crosses another
+    one, and where a line end lies within tol of it. Lines are cut at the
+    segment and parameter of every intersection, without projecting the
+    points again, so crossings are split with any tolerance. Cuts within
+    tol of the segment vertices are snapped to them and cuts within tol of
+    the line ends are ignored, as in split_linestring_m.
+
+    Return (parts, sources). Where:
+    parts: list, [[(x, y), ..], ..] line string parts
+    sources: list, index of the source line string of every part
+
+    Arguments
+    ---------
+    linestrings: list, [[(x, y), ..], ..]
+    tol: float, tolerance distance
+    """
+
+    # BUCKET SEGMENTS
+    segments = []
+    for k, line in enumerate(linestrings):
+        for i in range(len(line)-1):
+            segments.append((k, i))
+    lengths = [hypot(linestrings[k][i+1][0]-linestrings[k][i][0],
+                     linestrings[k][i+1][1]-linestrings[k][i][1])
+               for k, i in segments]
+    size = max(sum(lengths) / max(len(lengths), 1), 2*tol, 1E-9)
+    grid = PointGrid(size)
+    cells = {}
+    for index, (k, i) in enumerate(segments):
+        p1, p2 = linestrings[k][i], linestrings[k][i+1]
+        i1, j1 = grid.key(min(p1[0], p2[0])-tol, min(p1[1], p2[1])-tol)
+        i2, j2 = grid.key(max(p1[0], p2[0])+tol, max(p1[1], p2[1])+tol)
+        for ci in range(i1, i2+1):
+            for cj in range(j1, j2+1):
+                cells.setdefault((ci, cj), []).append(index)
+
+    # INTERSECT SEGMENTS SHARING A CELL
+    splitting = [[] for _ in linestrings]
+    tested = set()
+    for bucket in cells.values():
+        for m, first in enumerate(bucket):
+            k1, i1 = segments[first]
+            line1 = linestrings[k1]
+            for second in bucket[m+1:]:
+                k2, i2 = segments[second]
+                if k1 == k2 or (first, second) in tested:
+                    continue
+                tested.add((first, second))
+                line2 = linestrings[k2]
+                ends = (i1 == 0, i1 == len(line1)-2,
+                        i2 == 0, i2 == len(line2)-2)
+                nodes = _segment_nodes(line1[i1], line1[i1+1],
+                                       line2[i2], line2[i2+1], ends, tol)
+                for point, side, t in nodes:
+                    splitting[(k1, k2)[side]].append(((i1, i2)[side], t))
+
+    # SPLIT
+    parts = []
+    sources = []
+    for k, line in enumerate(linestrings):
+        if splitting[k]:
+            chainages = linestring_chainages(line)
+            cuts = [_segment_location(line, chainages, i, t, tol)
+                    for i, t in sorted(set(splitting[k]))]
+            splitted = cut_linestring(line, cuts, tol, chainages)
+        else:
+            splitted = [line]
+        parts.extend(splitted)
+        sources.extend([k]*len(splitted))
+    return parts, sources
+
+class LineSplitter:
+    """Split line strings at points indexed once in a hash grid.
+
+    Arguments
+    ---------
+    points: list, [(x, y), ..] splitting points
+    tol: float, tolerance distance
+    """
+    def __init__(self, points, tol=0.0):
+        self.tol = tol
+        self.points = points
+        self.grid = PointGrid(cell_size(points, minimum=max(2*tol, 1E-9)))
+        for index, point in enumerate(points):
+            self.grid.add(index, point[0], point[1])
+
+    def candidates(self, linestring):
+        """Return the points within tol of the line string, in input order."""
+        indexes = set()
+        for i in range(len(linestring)-1):
+            near = self.grid.near_segment(linestring[i], linestring[i+1],
+                                          self.tol)
+            indexes.update(item[0] for item in near)
+        return [self.points[index] for index in sorted(indexes)]
+
+    def split(self, linestring):
+        """Return the line string parts, [linestring] if it is not split."""
+        points = self.candidates(linestring)
+        if not points:
+            return [linestring]
+        return split_linestring_m(linestring, points, self.tol)
@@ -21,9 +21,17 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
+import mmap
+import os
+import shutil
+import struct
+import tempfile
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from math import ceil, floor, inf
 
 ACCEPTABLE_DEVIATION = 1E-5
+EPSILON = 2**-52
 
 class Triangle:
     '''Triangle defined for 3 points, (xi, yi, zi).'''
@@ -68,9 +76,12 @@ class Triangle:
 
 class TIN:
     '''TIN surface.'''
+    FACES_PER_CELL = 8
+
     def __init__(self):
         self._faces = []
         self._points = {}
+        self._grid = None
 
     def from_landxml(self, file, surfname=''):
         '''Load a TIN surface from a landXLM file.
@@ -92,16 +103,102 @@ class TIN:
                         self._points[point.attrib['id']] = x, y, z
                     for face in surface[1][1]:
                         self._faces.append(face.text.split())
+                    self._grid = None
                     break
         else:
             raise Exception('Incorrect name or none surface found.')
 
+    def from_points(self, points):
+        '''Build a Delaunay TIN surface from points [(x1, y1, z1)..].
+
+        Duplicated (x, y) points are ignored, the first one is kept.
+        '''
+        self._points = {}
+        self._faces = []
+        self._grid = None
+        for index, point in enumerate(points):
+            self._points[str(index)] = tuple(map(float, point[0:3]))
+        coords = [v[0:2] for v in self._points.values()]
+        for face in delaunay(coords):
+            self._faces.append([str(vertex) for vertex in face])
+        if not self._faces:
+            raise Exception('At least 3 non collinear points are required.')
+
+    def from_xyz(self, file):
+        '''Build a Delaunay TIN surface from a XYZ text file.
+
+        Every line contains the x, y and z coordinates, separated by blanks,
+        commas or semicolons. Empty lines, comments (#) and headers are
+        skipped.
+
+        Parameters
+        ----------
+        file, string, is the XYZ file name
+        '''
+        points = []
+        with open(file, 'r') as xyz:
+            for line in xyz:
+                values = line.split('#')[0].replace(',', ' ').replace(';', ' ')
+                values = values.split()
+                if len(values) < 3:
+                    continue
+                try:
+                    points.append(tuple(map(float, values[0:3])))
+                except ValueError:
+                    continue
+        self.from_points(points)
+
+    def face_count(self):
+        '''Return the number of faces.'''
+        return len(self._faces)
+
+    def faces(self):
+        '''Yield the faces as ((x1, y1, z1), (x2, y2, z2), (x3, y3, z3)).'''
+        for face in self._faces:
+            yield tuple(self._points[vertex] for vertex in face)
+
+    def _index(self):
+        '''Bucket the faces in a regular grid by their bounding boxes.'''
+        tol = ACCEPTABLE_DEVIATION
+        boxes = []
+        x1 = y1 = inf
+        x2 = y2 = -inf
+        for v1, v2, v3 in self.faces():
+            box = (min(v1[0], v2[0], v3[0]) - tol,
+                   min(v1[1], v2[1], v3[1]) - tol,
+                   max(v1[0], v2[0], v3[0]) + tol,
+                   max(v1[1], v2[1], v3[1]) + tol)
+            boxes.append(box)
+            x1, y1 = min(x1, box[0]), min(y1, box[1])
+            x2, y2 = max(x2, box[2]), max(y2, box[3])
+        area = max((x2-x1) * (y2-y1), 1E-12)
+        size = (area * self.FACES_PER_CELL / max(len(boxes), 1))**0.5
+        cells = {}
+        for index, box in enumerate(boxes):
+            i1, j1 = int((box[0]-x1) // size), int((box[1]-y1) // size)
+            i2, j2 = int((box[2]-x1) // size), int((box[3]-y1) // size)
+            for i in range(i1, i2+1):
+                for j in range(j1, j2+1):
+                    cells.setdefault((i, j), []).append(index)
+        self._grid = (x1, y1, size, cells)
+
     def elevations(self, points):
         '''Return elevations [z1,..] from points [(x1, y1)..].
+
+        Only the faces bucketed in the grid cell of every point are tested,
+        in file order, so the first containing face is used as before.
+        Without faces every elevation is None.
         '''
+        if not self._faces:
+            return [None] * len(points)
+        if self._grid is None:
+            self._index()
+        x0, y0, size, cells = self._grid
         result = []
         for p in points:
-            for face in self._faces:
+            key = int((p[0]-x0) // size), int((p[1]-y0) // size)
+            for index in cells.get(key, []):
+                face = self._faces[index]
                 v1, v2, v3 = [self._points[vertex] for vertex in face]
                 t = Triangle(v1, v2, v3)
                 if t.is_inside(p):
@@ -110,3 +207,467 @@ class TIN:
             else:
                 result.append(None)
         return result
+
+
+class TiledTIN:
+    '''Out-of-core TIN surface.
+
+    Faces are partitioned into square tiles and stored in a memory-mapped
+    file. Only the tiles touched by the query points are read, and they are
+    kept in a LRU cache limited by a memory budget.
+
+    Parameters
+    ----------
+    budget: int, tile cache memory budget in bytes, default 256 MB
+    tile_size: float, tile side length, by default it is estimated to hold
+    FACES_PER_TILE faces per tile
+    folder: str, directory of the tile files, by default a temporary one
+    '''
+    FACE_SIZE = 9 * 8
+    FACES_PER_TILE = 1024
+
+    def __init__(self, budget=256*2**20, tile_size=None, folder=None):
+        self.budget = budget
+        self.tile_size = tile_size
+        self._folder = folder
+        self._tmpdir = None
+        self._file = None
+        self._mm = None
+        self._origin = (0.0, 0.0)
+        self._tiles = {}
+        self._cache = OrderedDict()
+        self._used = 0
+        self.loads = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''Release the mapped file and remove the temporary tile files.'''
+        self._cache.clear()
+        self._used = 0
+        if self._mm:
+            self._mm.close()
+            self._mm = None
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def from_landxml(self, file, surfname=''):
+        '''Build the tiled surface from a landXLM file.
+
+        The file is parsed incrementally, so only the point table is kept
+        in memory while the tiles are written.
+
+        Parameters
+        ----------
+        file, string, is the LandXML file name
+        surfname, string, is the surface name, by default load the first one
+        '''
+        self.from_faces(landxml_faces(file, surfname))
+
+    def from_faces(self, faces):
+        '''Build the tiled surface from an iterable of faces.
+
+        Parameters
+        ----------
+        faces: iterable, [((x1, y1, z1), (x2, y2, z2), (x3, y3, z3)), ..]
+        '''
+        self.close()
+        folder = self._folder
+        if folder is None:
+            folder = self._tmpdir = tempfile.mkdtemp(prefix='wnt_tin_')
+        face = struct.Struct('9d')
+
+        # WRITE RAW FACES AND GET THE EXTENT
+        rawname = os.path.join(folder, 'faces.raw')
+        count = 0
+        x1 = y1 = inf
+        x2 = y2 = -inf
+        with open(rawname, 'wb') as raw:
+            for v1, v2, v3 in faces:
+                raw.write(face.pack(*v1[0:3], *v2[0:3], *v3[0:3]))
+                x1 = min(x1, v1[0], v2[0], v3[0])
+                y1 = min(y1, v1[1], v2[1], v3[1])
+                x2 = max(x2, v1[0], v2[0], v3[0])
+                y2 = max(y2, v1[1], v2[1], v3[1])
+                count += 1
+        if not count:
+            os.remove(rawname)
+            raise Exception('Empty surface.')
+        self._origin = (x1, y1)
+        if not self.tile_size:
+            area = max((x2-x1) * (y2-y1), 1.0)
+            self.tile_size = (area * self.FACES_PER_TILE / count)**0.5
+
+        # COUNT FACES PER TILE
+        with open(rawname, 'rb') as raw:
+            rawmm = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+            sizes = {}
+            for values in face.iter_unpack(rawmm):
+                for key in self._face_tiles(values):
+                    sizes[key] = sizes.get(key, 0) + 1
+            start = 0
+            self._tiles = {}
+            for key in sorted(sizes):
+                self._tiles[key] = (start, sizes[key])
+                start += sizes[key]
+
+            # WRITE FACES GROUPED BY TILE
+            tilename = os.path.join(folder, 'faces.tiles')
+            with open(tilename, 'wb') as tiles:
+                tiles.truncate(start * self.FACE_SIZE)
+            self._file = open(tilename, 'r+b')
+            self._mm = mmap.mmap(self._file.fileno(), 0)
+            cursor = {key: value[0] for key, value in self._tiles.items()}
+            for values in face.iter_unpack(rawmm):
+                for key in self._face_tiles(values):
+                    face.pack_into(self._mm, cursor[key]*self.FACE_SIZE, *values)
+                    cursor[key] += 1
+            self._mm.flush()
+            rawmm.close()
+        os.remove(rawname)
+
+    def _tile_key(self, x, y):
+        '''Return the tile index (i, j) containing the point (x, y).'''
+        i = int(floor((x - self._origin[0]) / self.tile_size))
+        j = int(floor((y - self._origin[1]) / self.tile_size))
+        return i, j
+
+    def _face_tiles(self, values):
+        '''Return the keys of the tiles overlapped by the face bounding box.'''
+        xs = values[0::3]
+        ys = values[1::3]
+        tol = ACCEPTABLE_DEVIATION
+        i1, j1 = self._tile_key(min(xs)-tol, min(ys)-tol)
+        i2, j2 = self._tile_key(max(xs)+tol, max(ys)+tol)
+        return [(i, j) for i in range(i1, i2+1) for j in range(j1, j2+1)]
+
+    def _load(self, key):
+        '''Return the faces of a tile as a flat array, using the LRU cache.'''
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        start, count = self._tiles[key]
+        size = count * self.FACE_SIZE
+        offset = start * self.FACE_SIZE
+        tile = memoryview(self._mm[offset:offset+size]).cast('d')
+        self.loads += 1
+        self._cache[key] = tile
+        self._used += size
+        while self._used > self.budget and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._used -= old.nbytes
+        return tile
+
+    def elevations(self, points):
+        '''Return elevations [z1,..] from points [(x1, y1)..].
+
+        Points are grouped by tile, so every tile is read once per call.
+        Without tiles every elevation is None.
+        '''
+        result = [None] * len(points)
+        if not self._tiles:
+            return result
+        groups = {}
+        for index, p in enumerate(points):
+            key = self._tile_key(p[0], p[1])
+            if key in self._tiles:
+                groups.setdefault(key, []).append(index)
+        tol = ACCEPTABLE_DEVIATION
+        for key, indexes in groups.items():
+            tile = self._load(key)
+            for index in indexes:
+                x, y = points[index][0:2]
+                for k in range(0, len(tile), 9):
+                    xs = tile[k], tile[k+3], tile[k+6]
+                    ys = tile[k+1], tile[k+4], tile[k+7]
+                    if x < min(xs)-tol or x > max(xs)+tol:
+                        continue
+                    if y < min(ys)-tol or y > max(ys)+tol:
+                        continue
+                    t = Triangle(tile[k:k+3], tile[k+3:k+6], tile[k+6:k+9])
+                    if t.is_inside((x, y)):
+                        result[index] = t.z((x, y))
+                        break
+        return result
+
+
+def landxml_faces(file, surfname=''):
+    '''Yield the faces of a TIN surface stored in a landXLM file.
+
+    The file is parsed incrementally. Every face is yielded as a tuple of
+    its vertices ((x1, y1, z1), (x2, y2, z2), (x3, y3, z3)).
+
+    Parameters
+    ----------
+    file, string, is the LandXML file name
+    surfname, string, is the surface name, by default load the first one
+    '''
+    prefix = '{http://www.landxml.org/schema/LandXML-1.2}'
+    points = {}
+    insurface = found = False
+    parent = None
+    for event, element in ET.iterparse(file, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if tag in (prefix + 'Pnts', prefix + 'Faces'):
+                parent = element
+            elif tag == prefix + 'Surface':
+                name = element.attrib.get('name', '')
+                insurface = surfname == '' or surfname == name
+            elif tag == prefix + 'Definition' and insurface:
+                insurface = element.attrib.get('surfType') == 'TIN'
+                found = found or insurface
+            continue
+        if insurface and tag in (prefix + 'P', prefix + 'F'):
+            if tag == prefix + 'P':
+                y, x, z = tuple(map(float, element.text.split()))
+                points[element.attrib['id']] = x, y, z
+            else:
+                yield tuple(points[vertex] for vertex in element.text.split())
+            # DROP EVERY PARSED POINT AND FACE, MEMORY DOES NOT GROW
+            element.clear()
+            parent.remove(element)
+        elif tag == prefix + 'Surface':
+            if found:
+                return
+            insurface = False
+        if tag in (prefix + 'Pnts', prefix + 'Faces'):
+            element.clear()
+    raise Exception('Incorrect name or none surface found.')
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    '''Return the orientation determinant, > 0 if a, b, c turn clockwise.'''
+    return (ay - cy) * (bx - cx) - (ax - cx) * (by - cy)
+
+
+def _in_circle(ax, ay, bx, by, cx, cy, px, py):
+    '''Check if p is inside the circumcircle of the triangle a, b, c.'''
+    dx, dy = ax - px, ay - py
+    ex, ey = bx - px, by - py
+    fx, fy = cx - px, cy - py
+    ap = dx * dx + dy * dy
+    bp = ex * ex + ey * ey
+    cp = fx * fx + fy * fy
+    det = dx * (ey * cp - bp * fy) - dy * (ex * cp - bp * fx)
+    return det + ap * (ex * fy - ey * fx) < 0
+
+
+def _circumcircle(ax, ay, bx, by, cx, cy):
+    '''Return the circumcenter (x, y) and the squared circumradius.'''
+    dx, dy = bx - ax, by - ay
+    ex, ey = cx - ax, cy - ay
+    bl = dx * dx + dy * dy
+    cl = ex * ex + ey * ey
+    d = dx * ey - dy * ex
+    if d == 0:
+        return (ax, ay), inf
+    x = (ey * bl - dy * cl) * 0.5 / d
+    y = (dx * cl - ex * bl) * 0.5 / d
+    return (ax + x, ay + y), x * x + y * y
+
+
+def _pseudo_angle(dx, dy):
+    '''Return a monotonic value in [0, 1] of the angle of (dx, dy).'''
+    p = dx / (abs(dx) + abs(dy))
+    return (3 - p if dy > 0 else 1 + p) / 4
+
+
+def delaunay(coords):
+    '''Return the Delaunay triangulation of points [(x1, y1)..].
+
+    The result is a list of faces [(i, j, k), ..] of point indexes.
+
+    The points are sorted by distance to the circumcenter of a seed
+    triangle and inserted in that order outside the current convex hull,
+    which is looked up through an angular hash. Every new triangle is
+    legalized by edge flipping. It runs in O(n log n) time for usual
+    survey data. Duplicated points are ignored.
+    '''
+    n = len(coords)
+    if n < 3:
+        return []
+    xs = [float(c[0]) for c in coords]
+    ys = [float(c[1]) for c in coords]
+
+    # SEED TRIANGLE. CLOSEST POINT TO THE CENTER, ITS NEAREST NEIGHBOUR
+    # AND THE POINT WITH THE SMALLEST CIRCUMCIRCLE
+    cx = (min(xs) + max(xs)) / 2
+    cy = (min(ys) + max(ys)) / 2
+    i0 = min(range(n), key=lambda i: (xs[i]-cx)**2 + (ys[i]-cy)**2)
+    i1 = None
+    mindist = inf
+    for i in range(n):
+        d = (xs[i]-xs[i0])**2 + (ys[i]-ys[i0])**2
+        if 0 < d < mindist:
+            i1, mindist = i, d
+    if i1 is None:
+        return []
+    i2 = None
+    minradius = inf
+    for i in range(n):
+        if i in (i0, i1):
+            continue
+        r = _circumcircle(xs[i0], ys[i0], xs[i1], ys[i1], xs[i], ys[i])[1]
+        if r < minradius:
+            i2, minradius = i, r
+    if i2 is None:
+        return []
+    if _orient(xs[i0], ys[i0], xs[i1], ys[i1], xs[i2], ys[i2]) < 0:
+        i1, i2 = i2, i1
+    center = _circumcircle(xs[i0], ys[i0], xs[i1], ys[i1], xs[i2], ys[i2])[0]
+    ids = sorted(range(n),
+                 key=lambda i: (xs[i]-center[0])**2 + (ys[i]-center[1])**2)
+
+    # HALF-EDGE STRUCTURE
+    triangles = []
+    halfedges = []
+    hull_prev = [0] * n
+    hull_next = [0] * n
+    hull_tri = [0] * n
+    hash_size = max(int(ceil(n**0.5)), 1)
+    hull_hash = [-1] * hash_size
+
+    def hash_key(x, y):
+        angle = _pseudo_angle(x - center[0], y - center[1])
+        return int(floor(angle * hash_size)) % hash_size
+
+    def link(a, b):
+        halfedges[a] = b
+        if b != -1:
+            halfedges[b] = a
+
+    def add_triangle(j0, j1, j2, a, b, c):
+        t = len(triangles)
+        triangles.extend((j0, j1, j2))
+        halfedges.extend((-1, -1, -1))
+        link(t, a)
+        link(t + 1, b)
+        link(t + 2, c)
+        return t
+
+    hull = {'start': i0}
+
+    def legalize(a):
+        stack = []
+        while True:
+            b = halfedges[a]
+            a0 = a - a % 3
+            ar = a0 + (a + 2) % 3
+            if b == -1:
+                if not stack:
+                    break
+                a = stack.pop()
+                continue
+            b0 = b - b % 3
+            al = a0 + (a + 1) % 3
+            bl = b0 + (b + 2) % 3
+            p0, pr = triangles[ar], triangles[a]
+            pl, p1 = triangles[al], triangles[bl]
+            if _in_circle(xs[p0], ys[p0], xs[pr], ys[pr],
+                          xs[pl], ys[pl], xs[p1], ys[p1]):
+                triangles[a] = p1
+                triangles[b] = p0
+                hbl = halfedges[bl]
+
+                # EDGE FLIPPED ON THE OTHER SIDE OF THE HULL
+                if hbl == -1:
+                    e = hull['start']
+                    while True:
+                        if hull_tri[e] == bl:
+                            hull_tri[e] = a
+                            break
+                        e = hull_prev[e]
+                        if e == hull['start']:
+                            break
+                link(a, hbl)
+                link(b, halfedges[ar])
+                link(ar, bl)
+                stack.append(b0 + (b + 1) % 3)
+            else:
+                if not stack:
+                    break
+                a = stack.pop()
+        return ar
+
+    # SEED HULL
+    hull_next[i0] = hull_prev[i2] = i1
+    hull_next[i1] = hull_prev[i0] = i2
+    hull_next[i2] = hull_prev[i1] = i0
+    hull_tri[i0], hull_tri[i1], hull_tri[i2] = 0, 1, 2
+    for i in (i0, i1, i2):
+        hull_hash[hash_key(xs[i], ys[i])] = i
+    add_triangle(i0, i1, i2, -1, -1, -1)
+
+    # INSERT POINTS
+    xp = yp = None
+    for k, i in enumerate(ids):
+        x, y = xs[i], ys[i]
+
+        # SKIP DUPLICATED AND SEED POINTS
+        if k > 0 and abs(x - xp) <= EPSILON and abs(y - yp) <= EPSILON:
+            continue
+        xp, yp = x, y
+        if i in (i0, i1, i2):
+            continue
+
+        # FIND A VISIBLE EDGE OF THE CONVEX HULL
+        start = 0
+        key = hash_key(x, y)
+        for j in range(hash_size):
+            start = hull_hash[(key + j) % hash_size]
+            if start != -1 and start != hull_next[start]:
+                break
+        start = hull_prev[start]
+        e = start
+        while True:
+            q = hull_next[e]
+            if _orient(x, y, xs[e], ys[e], xs[q], ys[q]) < 0:
+                break
+            e = q
+            if e == start:
+                e = -1
+                break
+        if e == -1:
+            continue
+
+        # ADD TRIANGLES FROM THE POINT TO THE VISIBLE HULL EDGES
+        t = add_triangle(e, i, hull_next[e], -1, -1, hull_tri[e])
+        hull_tri[i] = legalize(t + 2)
+        hull_tri[e] = t
+        m = hull_next[e]
+        while True:
+            q = hull_next[m]
+            if _orient(x, y, xs[m], ys[m], xs[q], ys[q]) >= 0:
+                break
+            t = add_triangle(m, i, q, hull_tri[i], -1, hull_tri[m])
+            hull_tri[i] = legalize(t + 2)
+            hull_next[m] = m
+            m = q
+        if e == start:
+            while True:
+                q = hull_prev[e]
+                if _orient(x, y, xs[q], ys[q], xs[e], ys[e]) >= 0:
+                    break
+                t = add_triangle(q, i, e, -1, hull_tri[e], hull_tri[q])
+                legalize(t + 2)
+                hull_tri[q] = t
+                hull_next[e] = e
+                e = q
+
+        # UPDATE THE HULL
+        hull['start'] = hull_prev[i] = e
+        hull_next[e] = hull_prev[m] = i
+        hull_next[i] = m
+        hull_hash[hash_key(x, y)] = i
+        hull_hash[hash_key(xs[e], ys[e])] = e
+
+    return [tuple(triangles[t:t+3]) for t in range(0, len(triangles), 3)]
@@ -29,7 +29,7 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
-from math import inf
+from math import isfinite
 from qgis.PyQt.QtCore import QCoreApplication, QVariant
 from qgis.core import (QgsFeature,
                        QgsField,
@@ -41,8 +41,11 @@ from qgis.core import (QgsFeature,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterField,
+                       QgsProcessingParameterNumber,
                        QgsWkbTypes
                       )
+from .utils_demand import assign_nearest
+from .utils_features import BufferedSink
 
 class AssignDemandAlgorithm(QgsProcessingAlgorithm):
     """
@@ -53,6 +56,7 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
     SOURCE_INPUT = 'SOURCE_LAYER_INPUT'
     SOURCE_FIELDS = 'SOURCE_FIELDS'
     TARGET_INPUT = 'TARGET_LAYER_INPUT'
+    WORKERS = 'WORKERS'
     ASSIGN_OUTPUT = 'ASSIGNMENT_LAYER_OUTPUT'
     NODE_OUTPUT = 'NODE_LAYER_OUTPUT'
 
@@ -103,6 +107,8 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
         Both source and target layer have to have an id field.
 
         Tip: The assignment can be edit using the *update* process.         
+        Tip: For large layers, use several worker processes. The result is 
+        identical to the single process run.
         ===
         Genera asignaciones de demanda.
         El resultado consiste en una capa de líneas que conectad las fuentes y
@@ -111,6 +117,8 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
         Las capas source and target deben tener un campo id.
         
         Consejo: Las asignaciones pueden ser actualizadas con *update*.
+        Consejo: Para capas grandes, use varios procesos. El resultado es 
+        idéntico al obtenido con un único proceso.
         ''')
 
     def initAlgorithm(self, config=None):
@@ -142,6 +150,15 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
                 types=[QgsProcessing.TypeVectorPoint]
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.WORKERS,
+                self.tr('Worker processes'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=1,
+                minValue=1
+                )
+            )
 
         # ADD PAIRS FEATURE SINK
         self.addParameter(
@@ -165,6 +182,7 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
         slayer = self.parameterAsSource(parameters, self.SOURCE_INPUT, context)
         sfields = self.parameterAsFields(parameters, self.SOURCE_FIELDS, context)
         tlayer = self.parameterAsSource(parameters, self.TARGET_INPUT, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
 
         # CHECK CRS
         crs = slayer.sourceCrs()
@@ -192,6 +210,7 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        assignment_sink = BufferedSink(assignment_sink, 'Assignment layer')
 
         fields = tlayer.fields()
         for field in sfields:
@@ -204,36 +223,59 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             crs
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
-        # ASSIGN, ACCUMULATE AND WRITE ASSIGNMENT LAYER
-        values = {}
+        # READ TARGETS AND SOURCES
+        targets = []
+        tids = []
         for tfeature in tlayer.getFeatures():
-            for field in sfields:
-                values[(tfeature["id"], field)] = 0.0
-        cnt = 0
+            tpoint = tfeature.geometry().asPoint()
+            targets.append((tpoint.x(), tpoint.y()))
+            tids.append(tfeature["id"])
+        if not targets:
+            feedback.reportError('ERROR: Target layer is empty!')
+            return {}
+        sources = []
+        sids = []
         for sfeature in slayer.getFeatures():
             sxy = sfeature.geometry().asPoint()
-            cdist = inf
-            cfeature = None
-            for tfeature in tlayer.getFeatures():
-                dist = tfeature.geometry().asPoint().distance(sxy)
-                if dist < cdist:
-                    cdist = dist
-                    cfeature = tfeature
+            demands = tuple(float(sfeature[field]) for field in sfields)
+            sources.append((sxy.x(), sxy.y(), demands))
+            sids.append(sfeature["id"])
+        skipped = sum(not isfinite(demand) for source in sources
+                      for demand in source[2])
+        if skipped:
+            msg = 'WARNING: {} not finite demands skipped.'.format(skipped)
+            feedback.pushInfo(msg)
+
+        # ASSIGN AND ACCUMULATE
+        def progress(fraction):
+            feedback.setProgress(40*fraction)
+
+        nearest, sums = assign_nearest(targets, sources, workers, progress)
+        values = {}
+        for tid in tids:
+            for field in sfields:
+                values[(tid, field)] = 0.0
+        for tid, tsums in zip(tids, sums):
+            for field, value in zip(sfields, tsums):
+                values[(tid, field)] += value
+
+        # WRITE ASSIGNMENT LAYER
+        cnt = 0
+        for sid, (x, y, demands), target in zip(sids, sources, nearest):
             f = QgsFeature()
-            spoint = QgsPoint(sxy)
-            cpoint = QgsPoint(cfeature.geometry().asPoint())
+            spoint = QgsPoint(x, y)
+            cpoint = QgsPoint(*targets[target])
             f.setGeometry(QgsLineString([spoint, cpoint]))
-            attr = [sfeature["id"], cfeature["id"]]
-            for field in sfields:
-                attr.append(sfeature[field])
-                values[(cfeature["id"], field)] += sfeature[field]
+            attr = [sid, tids[target]]
+            attr.extend(demands)
             f.setAttributes(attr)
             assignment_sink.addFeature(f)
             cnt += 1
 
             # SHOW PROGRESS
-            feedback.setProgress(50*cnt/slayer.featureCount())
+            feedback.setProgress(40+10*cnt/len(sources))
 
         # WRITE NODE LAYER
         cnt = 0
@@ -255,6 +297,8 @@ class AssignDemandAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo('Target #: {}.'.format(tlayer.featureCount()))
         nncnt = sum((1 for x in values if abs(values[x]) > 0))
         feedback.pushInfo('Not null assignment #: {}.'.format(nncnt))
+        assignment_sink.close(feedback)
+        node_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
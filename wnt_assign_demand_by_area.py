@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ WaterNetworkTools
+                                 A QGIS plugin
+ Water Network Modelling Utilities
+
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 by Andrés García Martínez
+        email                : ppnoptimizer@gmail.com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (QgsFeature,
+                       QgsField,
+                       QgsFields,
+                       QgsGeometry,
+                       QgsPointXY,
+                       QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingParameterFeatureSink,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterField,
+                       QgsSpatialIndex,
+                       QgsWkbTypes
+                      )
+from .utils_demand import exact, exact_to_float, voronoi_cells
+from .utils_features import BufferedSink
+
+class AssignDemandByAreaAlgorithm(QgsProcessingAlgorithm):
+    """
+    Assignate polygon demands to nodes by service areas (Voronoi cells).
+    """
+
+    # DEFINE CONSTANTS
+    NODE_INPUT = 'NODE_LAYER_INPUT'
+    DEMAND_INPUT = 'DEMAND_LAYER_INPUT'
+    DEMAND_FIELDS = 'DEMAND_FIELDS'
+    BOUNDARY_INPUT = 'BOUNDARY_LAYER_INPUT'
+    AREA_OUTPUT = 'AREA_LAYER_OUTPUT'
+    NODE_OUTPUT = 'NODE_LAYER_OUTPUT'
+
+    def tr(self, string):
+        """
+        Returns a translatable string with the self.tr() function.
+        """
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        """
+        Create a instance and return a new copy of algorithm.
+        """
+        return AssignDemandByAreaAlgorithm()
+
+    def name(self):
+        """
+        Returns the unique algorithm name, used for identifying the algorithm.
+        """
+        return 'assign_demand_by_area'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name.
+        """
+        return self.tr('Assign demand by service areas')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to.
+        """
+        return self.tr('Demand')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to.
+        """
+        return 'demand'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short help string for the algorithm.
+        """
+        return self.tr('''Assign polygon demands to nodes by service areas.
+        The service area of every node is its Voronoi (Thiessen) cell, 
+        optionally clipped to a boundary. The demand of every polygon is 
+        allocated to the nodes in proportion to the intersected area.
+        The result is a layer of service areas and an updated node layer. 
+        The node layer has to have an id field.
+
+        Tip: Demand outside the boundary is not allocated.
+        ===
+        Asigna demandas poligonales a nodos por áreas de servicio.
+        El área de servicio de cada nodo es su celda de Voronoi (Thiessen),
+        opcionalmente recortada por un contorno. La demanda de cada polígono 
+        se reparte entre los nodos en proporción al área intersecada.
+        El resultado consiste en una capa de áreas de servicio y una capa de 
+        nodos actualizada. La capa de nodos debe tener un campo id.
+
+        Consejo: La demanda fuera del contorno no se asigna.
+        ''')
+
+    def initAlgorithm(self, config=None):
+        """
+        Define the inputs and outputs of the algorithm.
+        """
+
+        # INPUT
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.NODE_INPUT,
+                self.tr('Node layer'),
+                types=[QgsProcessing.TypeVectorPoint]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.DEMAND_INPUT,
+                self.tr('Demand polygon layer'),
+                types=[QgsProcessing.TypeVectorPolygon]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.DEMAND_FIELDS,
+                self.tr('Demand fields'),
+                None,
+                self.DEMAND_INPUT,
+                allowMultiple=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.BOUNDARY_INPUT,
+                self.tr('Boundary layer'),
+                types=[QgsProcessing.TypeVectorPolygon],
+                optional=True
+                )
+            )
+
+        # ADD FEATURE SINKS
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.AREA_OUTPUT,
+                self.tr('Service area layer'),
+                QgsProcessing.TypeVectorPolygon
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.NODE_OUTPUT,
+                self.tr('Node with demands layer')
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        RUN PROCESS
+        """
+        # INPUT
+        nlayer = self.parameterAsSource(parameters, self.NODE_INPUT, context)
+        dlayer = self.parameterAsSource(parameters, self.DEMAND_INPUT, context)
+        dfields = self.parameterAsFields(parameters, self.DEMAND_FIELDS, context)
+        blayer = self.parameterAsSource(parameters, self.BOUNDARY_INPUT, context)
+
+        # CHECK CRS
+        crs = nlayer.sourceCrs()
+        if crs == dlayer.sourceCrs() and (not blayer or crs == blayer.sourceCrs()):
+
+            # SEND INFORMATION TO THE USER
+            feedback.pushInfo('='*40)
+            feedback.pushInfo('CRS is {}'.format(crs.authid()))
+        else:
+            msg = 'ERROR: Layers have different CRS!'
+            feedback.reportError(msg)
+            return {}
+
+        # OUTPUT LAYERS
+        fields = QgsFields()
+        fields.append(QgsField('id', QVariant.String))
+        for field in dfields:
+            fields.append(QgsField(field, QVariant.Double))
+        (area_sink, area_id) = self.parameterAsSink(
+            parameters,
+            self.AREA_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.MultiPolygon,
+            crs
+            )
+        area_sink = BufferedSink(area_sink, 'Service area layer')
+
+        fields = nlayer.fields()
+        for field in dfields:
+            fields.append(QgsField(field, QVariant.Double))
+        (node_sink, node_id) = self.parameterAsSink(
+            parameters,
+            self.NODE_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.Point,
+            crs
+            )
+        node_sink = BufferedSink(node_sink, 'Node layer')
+
+        # READ NODES
+        nids = []
+        points = []
+        for f in nlayer.getFeatures():
+            point = f.geometry().asPoint()
+            points.append((point.x(), point.y()))
+            nids.append(f["id"])
+        if not points:
+            feedback.reportError('ERROR: Node layer is empty!')
+            return {}
+
+        # BUILD SERVICE AREAS (ONCE FOR ALL THE DEMAND FIELDS)
+        extent = dlayer.sourceExtent()
+        boundary = None
+        if blayer:
+            boundary = QgsGeometry.unaryUnion(
+                [f.geometry() for f in blayer.getFeatures()])
+            extent.combineExtentWith(boundary.boundingBox())
+        xs = [p[0] for p in points] + [extent.xMinimum(), extent.xMaximum()]
+        ys = [p[1] for p in points] + [extent.yMinimum(), extent.yMaximum()]
+        box = (min(xs)-1.0, min(ys)-1.0, max(xs)+1.0, max(ys)+1.0)
+        areas = []
+        index = QgsSpatialIndex()
+        for k, cell in enumerate(voronoi_cells(points, box)):
+            geometry = QgsGeometry()
+            if cell:
+                ring = [QgsPointXY(x, y) for x, y in cell]
+                geometry = QgsGeometry.fromPolygonXY([ring])
+                if boundary:
+                    geometry = geometry.intersection(boundary)
+            areas.append(geometry)
+            if not geometry.isEmpty():
+                f = QgsFeature(k)
+                f.setGeometry(geometry)
+                index.insertFeature(f)
+        feedback.pushInfo('Service areas: {}.'.format(len(areas)))
+        feedback.setProgress(30)
+
+        # ALLOCATE DEMAND POLYGONS
+        totals = [[0]*len(dfields) for _ in areas]
+        allocated = [0]*len(dfields)
+        demand = [0]*len(dfields)
+        cnt = 0
+        for f in dlayer.getFeatures():
+            geometry = f.geometry()
+            area = geometry.area()
+            values = [float(f[field] or 0.0) for field in dfields]
+            for k, value in enumerate(values):
+                demand[k] += exact(value)
+            if area > 0:
+                for cell in index.intersects(geometry.boundingBox()):
+                    weight = areas[cell].intersection(geometry).area() / area
+                    if weight > 0:
+                        for k, value in enumerate(values):
+                            share = exact(weight*value)
+                            totals[cell][k] += share
+                            allocated[k] += share
+            cnt += 1
+
+            # SHOW PROGRESS
+            if cnt % 100 == 0:
+                feedback.setProgress(30+60*cnt/dlayer.featureCount())
+
+        # WRITE SERVICE AREAS AND NODES
+        f = QgsFeature()
+        for nid, geometry, values in zip(nids, areas, totals):
+            values = [exact_to_float(value) for value in values]
+            if not geometry.isEmpty():
+                # CELLS ARE POLYGONS, CLIPPED ONES MAY BE MULTIPOLYGONS
+                geometry.convertToMultiType()
+                f.setGeometry(geometry)
+                f.setAttributes([nid] + values)
+                area_sink.addFeature(f)
+        for f, values in zip(nlayer.getFeatures(), totals):
+            attr = f.attributes()
+            attr.extend(exact_to_float(value) for value in values)
+            f.setAttributes(attr)
+            node_sink.addFeature(f)
+
+        # SHOW PROGRESS
+        feedback.setProgress(100)
+        feedback.pushInfo('Demand polygon #: {}.'.format(cnt))
+        for field, total, value in zip(dfields, demand, allocated):
+            msg = '{}: allocated {} of {}.'
+            feedback.pushInfo(msg.format(field, exact_to_float(value),
+                                         exact_to_float(total)))
+        area_sink.close(feedback)
+        node_sink.close(feedback)
+        feedback.pushInfo('='*40)
+
+        # PROCCES CANCELED
+        if feedback.isCanceled():
+            return {}
+
+        # OUTPUT
+        return {self.AREA_OUTPUT: area_id, self.NODE_OUTPUT: node_id}
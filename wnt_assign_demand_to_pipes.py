@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ WaterNetworkTools
+                                 A QGIS plugin
+ Water Network Modelling Utilities
+
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 by Andrés García Martínez
+        email                : ppnoptimizer@gmail.com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from math import isfinite
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (QgsFeature,
+                       QgsField,
+                       QgsFields,
+                       QgsPoint,
+                       QgsLineString,
+                       QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingParameterFeatureSink,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterField,
+                       QgsWkbTypes
+                      )
+from .utils_demand import (assign_to_lines, demand_value, exact,
+                           exact_to_float)
+from .utils_features import BufferedSink
+
+class AssignDemandToPipesAlgorithm(QgsProcessingAlgorithm):
+    """
+    Assignate demands to the end nodes of the nearest pipe.
+    """
+
+    # DEFINE CONSTANTS
+    SOURCE_INPUT = 'SOURCE_LAYER_INPUT'
+    SOURCE_FIELDS = 'SOURCE_FIELDS'
+    LINK_INPUT = 'LINK_LAYER_INPUT'
+    NODE_INPUT = 'NODE_LAYER_INPUT'
+    ASSIGN_OUTPUT = 'ASSIGNMENT_LAYER_OUTPUT'
+    NODE_OUTPUT = 'NODE_LAYER_OUTPUT'
+
+    def tr(self, string):
+        """
+        Returns a translatable string with the self.tr() function.
+        """
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        """
+        Create a instance and return a new copy of algorithm.
+        """
+        return AssignDemandToPipesAlgorithm()
+
+    def name(self):
+        """
+        Returns the unique algorithm name, used for identifying the algorithm.
+        """
+        return 'assign_demand_to_pipes'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name.
+        """
+        return self.tr('Assign demand to pipes')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to.
+        """
+        return self.tr('Demand')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to.
+        """
+        return 'demand'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short help string for the algorithm.
+        """
+        return self.tr('''Generate demand assignments to pipes.
+        Every source is snapped to the nearest pipe and its demand is split 
+        between the start and end nodes of the pipe, in proportion to the 
+        position along it (chainage).
+        The result is a layer containing connecting lines between sources and 
+        pipes, with the position ratio, and an updated node layer.
+        Source and node layers have to have an id field, and the link layer 
+        id, start and end fields.
+        ===
+        Genera asignaciones de demanda a tuberías.
+        Cada fuente se proyecta sobre la tubería más próxima y su demanda se 
+        reparte entre los nodos inicial y final de la tubería, en proporción a
+        su posición a lo largo de ella.
+        El resultado consiste en una capa de líneas que conectan las fuentes y
+        las tuberías, con la posición relativa, y una capa de nodos con la 
+        demanda actualizada.
+        Las capas de fuentes y nodos deben tener un campo id, y la capa de 
+        líneas los campos id, start y end.
+        ''')
+
+    def initAlgorithm(self, config=None):
+        """
+        Define the inputs and outputs of the algorithm.
+        """
+
+        # INPUT
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.SOURCE_INPUT,
+                self.tr('Source layer'),
+                types=[QgsProcessing.TypeVectorPoint]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.SOURCE_FIELDS,
+                self.tr('Source demand fields'),
+                None,
+                self.SOURCE_INPUT,
+                allowMultiple=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.LINK_INPUT,
+                self.tr('Link layer'),
+                types=[QgsProcessing.TypeVectorLine]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.NODE_INPUT,
+                self.tr('Node layer'),
+                types=[QgsProcessing.TypeVectorPoint]
+                )
+            )
+
+        # ADD FEATURE SINKS
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.ASSIGN_OUTPUT,
+                self.tr('Assignment layer')
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.NODE_OUTPUT,
+                self.tr('Node with demands layer')
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        RUN PROCESS
+        """
+        # INPUT
+        slayer = self.parameterAsSource(parameters, self.SOURCE_INPUT, context)
+        sfields = self.parameterAsFields(parameters, self.SOURCE_FIELDS, context)
+        llayer = self.parameterAsSource(parameters, self.LINK_INPUT, context)
+        nlayer = self.parameterAsSource(parameters, self.NODE_INPUT, context)
+
+        # CHECK CRS
+        crs = slayer.sourceCrs()
+        if crs == llayer.sourceCrs() == nlayer.sourceCrs():
+
+            # SEND INFORMATION TO THE USER
+            feedback.pushInfo('='*40)
+            feedback.pushInfo('CRS is {}'.format(crs.authid()))
+        else:
+            msg = 'ERROR: Layers have different CRS!'
+            feedback.reportError(msg)
+            return {}
+
+        # OUTPUT LAYERS
+        fields = QgsFields()
+        fields.append(QgsField('source', QVariant.String))
+        fields.append(QgsField('link', QVariant.String))
+        fields.append(QgsField('fraction', QVariant.Double))
+        for field in sfields:
+            fields.append(QgsField(field, QVariant.Double))
+        (assignment_sink, assignment_id) = self.parameterAsSink(
+            parameters,
+            self.ASSIGN_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.LineString,
+            crs
+            )
+        assignment_sink = BufferedSink(assignment_sink, 'Assignment layer')
+
+        fields = nlayer.fields()
+        for field in sfields:
+            fields.append(QgsField(field, QVariant.Double))
+        (node_sink, node_id) = self.parameterAsSink(
+            parameters,
+            self.NODE_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.Point,
+            crs
+            )
+        node_sink = BufferedSink(node_sink, 'Node layer')
+
+        # READ LINKS AND SOURCES
+        lines = []
+        links = []
+        for f in llayer.getFeatures():
+            line = [(p.x(), p.y()) for p in f.geometry().asPolyline()]
+            lines.append(line)
+            links.append((f["id"], f["start"], f["end"]))
+        sources = []
+        for f in slayer.getFeatures():
+            point = f.geometry().asPoint()
+            demands = [demand_value(f[field]) for field in sfields]
+            sources.append((f["id"], (point.x(), point.y()), demands))
+        skipped = sum(not isfinite(demand) for source in sources
+                      for demand in source[2])
+        if skipped:
+            msg = 'WARNING: {} not finite demands skipped.'.format(skipped)
+            feedback.pushInfo(msg)
+
+        # SNAP SOURCES TO PIPES
+        assigned = assign_to_lines(lines, [s[1] for s in sources])
+        feedback.setProgress(50)
+
+        # ACCUMULATE AND WRITE ASSIGNMENT LAYER
+        values = {}
+        cnt = 0
+        for (sid, sxy, demands), assignment in zip(sources, assigned):
+            if assignment is None:
+                continue
+            line, fraction, xy = assignment
+            lid, start, end = links[line]
+            for node, share in ((start, 1.0-fraction), (end, fraction)):
+                for field, demand in zip(sfields, demands):
+                    if not isfinite(demand):
+                        continue
+                    key = (node, field)
+                    values[key] = values.get(key, 0) + exact(share*demand)
+            f = QgsFeature()
+            f.setGeometry(QgsLineString([QgsPoint(*sxy), QgsPoint(*xy)]))
+            f.setAttributes([sid, lid, fraction] + demands)
+            assignment_sink.addFeature(f)
+            cnt += 1
+        feedback.setProgress(75)
+
+        # WRITE NODE LAYER
+        for f in nlayer.getFeatures():
+            attr = f.attributes()
+            for field in sfields:
+                attr.append(exact_to_float(values.get((f["id"], field), 0)))
+            f.setAttributes(attr)
+            node_sink.addFeature(f)
+
+        # SHOW PROGRESS
+        feedback.setProgress(100)
+        feedback.pushInfo('Source #: {}.'.format(len(sources)))
+        feedback.pushInfo('Assigned source #: {}.'.format(cnt))
+        feedback.pushInfo('Link #: {}.'.format(len(lines)))
+        assignment_sink.close(feedback)
+        node_sink.close(feedback)
+        feedback.pushInfo('='*40)
+
+        # PROCCES CANCELED
+        if feedback.isCanceled():
+            return {}
+
+        # OUTPUT
+        return {self.ASSIGN_OUTPUT: assignment_id, self.NODE_OUTPUT: node_id}
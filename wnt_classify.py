@@ -39,6 +39,7 @@ from qgis.core import (QgsField,
                        QgsWkbTypes
                        )
 from . import utils_graph as gr
+from .utils_features import BufferedSink, attribute_rows
 
 class ClassifyAlgorithm(QgsProcessingAlgorithm):
     """
@@ -150,6 +151,7 @@ class ClassifyAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs=links.sourceCrs()
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # CREATE NETWORK
         netg = gr.Graph()
@@ -159,8 +161,9 @@ class ClassifyAlgorithm(QgsProcessingAlgorithm):
 
         # LINKS
         cnt = 0
-        for f in links.getFeatures():
-            netg.add_edge(f['id'], f['start'], f['end'])
+        for lid, start, end in attribute_rows(links, ['id', 'start', 'end']):
+            cnt += 1
+            netg.add_edge(lid, start, end)
 
             # SHOW PROGRESS
             if cnt % 100 == 0:
@@ -172,7 +175,6 @@ class ClassifyAlgorithm(QgsProcessingAlgorithm):
         # WRITE LINK LAYER
         cnt = 0
         for f in links.getFeatures():
-            print(classified[f['id']])
             cnt += 1
             attr = f.attributes()
             attr.extend(list(classified[f['id']][:]))
@@ -188,6 +190,7 @@ class ClassifyAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo('='*40)
         msg = 'Processed: {} links'.format(nofl)
         feedback.pushInfo(msg)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -29,18 +29,48 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
+import heapq
 from qgis.PyQt.QtCore import QCoreApplication, QVariant
 from qgis.core import (QgsFeature,
                        QgsField,
                        QgsFields,
+                       QgsGeometry,
+                       QgsPointXY,
                        QgsProcessing,
                        QgsProcessingAlgorithm,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterNumber,
+                       QgsRectangle,
+                       QgsSpatialIndex,
                        QgsWkbTypes
                       )
+from .utils_features import BufferedSink
+from .utils_segments import FeatureEdges
 
+def _box_distance(a, b):
+    """
+    Return the distance between two bounding boxes, a lower bound of the
+    distance between the geometries they contain.
+    """
+    dx = max(a.xMinimum()-b.xMaximum(), b.xMinimum()-a.xMaximum(), 0.0)
+    dy = max(a.yMinimum()-b.yMaximum(), b.yMinimum()-a.yMaximum(), 0.0)
+    return (dx*dx + dy*dy)**0.5
+
+def _edges(geometry):
+    """
+    Return the edges of a line or polygon geometry.
+    """
+    if geometry.type() == QgsWkbTypes.LineGeometry:
+        if geometry.isMultipart():
+            return FeatureEdges(geometry.asMultiPolyline())
+        return FeatureEdges([geometry.asPolyline()])
+    if geometry.isMultipart():
+        rings = [ring for polygon in geometry.asMultiPolygon()
+                 for ring in polygon]
+    else:
+        rings = geometry.asPolygon()
+    return FeatureEdges(rings, polygon=True)
 
 class ConnectByDistanceAlgorithm(QgsProcessingAlgorithm):
     """
@@ -192,38 +222,96 @@ class ConnectByDistanceAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        connection_sink = BufferedSink(connection_sink, 'Connection layer')
+
+        # POINT TO LINE OR POLYGON EDGE DISTANCES
+        fast = (s_ly.wkbType() != QgsWkbTypes.Unknown
+                and QgsWkbTypes.geometryType(s_ly.wkbType())
+                == QgsWkbTypes.PointGeometry
+                and not QgsWkbTypes.isMultiType(s_ly.wkbType())
+                and QgsWkbTypes.geometryType(t_ly.wkbType())
+                in (QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry))
+        edges = {}
+
+        # INDEX TARGETS (READ ONCE)
+        targets = {}
+        index = QgsSpatialIndex()
+        for order, target in enumerate(t_ly.getFeatures()):
+            geometry = target.geometry()
+            if geometry.isEmpty():
+                continue
+            targets[target.id()] = (order, target["id"], geometry)
+            index.insertFeature(target)
 
         # COMPUTE AND WRITE LINK LAYER
         f = QgsFeature()
         cnt = 0
-        for source in s_ly.getFeatures():
-            possible_connections = []
-            for target in t_ly.getFeatures():
-                geometry = source.geometry().shortestLine(target.geometry())
-                distance = geometry.length()
-                if distance <= max_dst:
-                    connection = [geometry]
-                    connection.append(source["id"])
-                    connection.append(target["id"])
-                    connection.append(distance)
-                    possible_connections.append(connection)
-            possible_connections.sort(key=lambda d: d[-1])
-            connections = possible_connections[:max_con]
-            for connection in connections:
-                connection.append(len(connections))
-                f.setGeometry(connection[0])
-                f.setAttributes(connection[1:])
+        tot = s_ly.featureCount()
+        for scnt, source in enumerate(s_ly.getFeatures()):
+            sgeometry = source.geometry()
+            if max_con < 1 or sgeometry.isEmpty():
+                continue
+
+            # CANDIDATES WITHIN MAX DISTANCE, CLOSEST BOUNDING BOX FIRST
+            box = sgeometry.boundingBox()
+            search = QgsRectangle(box.xMinimum()-max_dst,
+                                  box.yMinimum()-max_dst,
+                                  box.xMaximum()+max_dst,
+                                  box.yMaximum()+max_dst)
+            candidates = []
+            for fid in index.intersects(search):
+                order, tid, tgeometry = targets[fid]
+                bound = _box_distance(box, tgeometry.boundingBox())
+                if bound <= max_dst:
+                    candidates.append((bound, order, fid))
+            candidates.sort()
+
+            # KEEP THE BEST CONNECTIONS IN A BOUNDED HEAP
+            heap = []
+            for bound, order, fid in candidates:
+                if len(heap) == max_con and bound > -heap[0][0]:
+                    break
+                tid, tgeometry = targets[fid][1:]
+                if fast:
+                    if fid not in edges:
+                        edges[fid] = _edges(tgeometry)
+                    point = sgeometry.asPoint()
+                    distance, nearest = edges[fid].nearest(
+                        (point.x(), point.y()))
+                else:
+                    geometry = sgeometry.shortestLine(tgeometry)
+                    distance = geometry.length()
+                if distance > max_dst:
+                    continue
+                if fast:
+                    geometry = QgsGeometry.fromPolylineXY(
+                        [point, QgsPointXY(*nearest)])
+                item = (-distance, -order, geometry, tid)
+                if len(heap) < max_con:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+            connections = sorted(heap, key=lambda d: (-d[0], -d[1]))
+            for distance, order, geometry, tid in connections:
+                f.setGeometry(geometry)
+                f.setAttributes([source["id"], tid, -distance,
+                                 len(connections)])
                 connection_sink.addFeature(f)
                 cnt += 1
 
             # SHOW PROGRESS
-            feedback.setProgress(100*cnt/s_ly.featureCount())
+            if feedback.isCanceled():
+                break
+            feedback.setProgress(100*(scnt+1)/tot)
 
         # SHOW PROGRESS
         feedback.pushInfo(f'Source #: {s_ly.featureCount()}.')
         feedback.pushInfo(f'Target #: {t_ly.featureCount()}.')
         feedback.pushInfo(f'Link #: {cnt}.')
 
+        # WRITE PENDING FEATURES
+        connection_sink.close(feedback)
+
         # PROCCES CANCELED
         if feedback.isCanceled():
             return {}
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ WaterNetworkTools
+                                 A QGIS plugin
+ Water Network Modelling Utilities
+
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 by Andrés García Martínez
+        email                : ppnoptimizer@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterFeatureSink,
+                       QgsProcessingParameterField
+                      )
+from .utils_features import BufferedSink
+from . utils_tin import TIN
+
+class ElevationFromPointsAlgorithm(QgsProcessingAlgorithm):
+    """
+    Set the node elevation from survey points, building a Delaunay TIN.
+    """
+
+    # DEFINE CONSTANTS
+    NODE_INPUT = 'NODE_INPUT'
+    ELEV_FIELD = 'ELEV_FIELD'
+    POINT_INPUT = 'POINT_INPUT'
+    Z_FIELD = 'Z_FIELD'
+    XYZ_INPUT = 'XYZ_INPUT'
+    OUTPUT = 'OUTPUT'
+
+    def tr(self, string):
+        """
+        Returns a translatable string with the self.tr() function.
+        """
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        """
+        Create a instance and return a new copy of algorithm.
+        """
+        return ElevationFromPointsAlgorithm()
+
+    def name(self):
+        """
+        Returns the unique algorithm name, used for identifying the algorithm.
+        """
+        return 'elevation_from_points'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name.
+        """
+        return self.tr('Node elevation from survey points')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to.
+        """
+        return self.tr('Modify')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to.
+        """
+        return 'modify'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short help string for the algorithm.
+        """
+        return self.tr('''Set network node elevation from survey points.
+        The points are triangulated (Delaunay) and the node elevations are 
+        interpolated on the TIN surface.
+        The points can be read from a point layer, using an elevation field or
+        the Z coordinate if none is selected, or from a XYZ text file.
+        ===
+        Añade elevación a los nodos de la red desde puntos topográficos.
+        Los puntos se triangulan (Delaunay) y la elevación de los nodos se 
+        interpola sobre la superficie TIN.
+        Los puntos pueden leerse desde una capa de puntos, usando un campo de 
+        elevación o la coordenada Z si no se selecciona ninguno, o desde un 
+        archivo de texto XYZ.
+        ''')
+
+    def initAlgorithm(self, config=None):
+        """
+        Define the inputs and outputs of the algorithm.
+        """
+
+        # ADD THE INPUT SOURCES
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.NODE_INPUT,
+                self.tr('Node vector layer input'),
+                types=[QgsProcessing.TypeVectorPoint]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.ELEV_FIELD,
+                self.tr('Elevation field'),
+                'elevation',
+                self.NODE_INPUT
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.POINT_INPUT,
+                self.tr('Survey point layer'),
+                types=[QgsProcessing.TypeVectorPoint],
+                optional=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.Z_FIELD,
+                self.tr('Survey point elevation field (if empty, Z coordinate)'),
+                None,
+                self.POINT_INPUT,
+                optional=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.XYZ_INPUT,
+                self.tr('XYZ file (if no survey point layer)'),
+                optional=True
+                )
+            )
+
+        #ADD THE OUTPUT SINK
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT,
+                self.tr('Nodes with elevation layer')
+                )
+            )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        RUN PROCESS
+        """
+
+        # INPUT
+        nodelayer = self.parameterAsSource(parameters, self.NODE_INPUT, context)
+        efield = self.parameterAsString(parameters, self.ELEV_FIELD, context)
+        pntlayer = self.parameterAsSource(parameters, self.POINT_INPUT, context)
+        zfield = self.parameterAsString(parameters, self.Z_FIELD, context)
+        xyzfile = self.parameterAsFile(parameters, self.XYZ_INPUT, context)
+
+        # SEND INFORMATION TO THE USER
+        crs = nodelayer.sourceCrs()
+        feedback.pushInfo('='*40)
+        feedback.pushInfo('CRS is {}'.format(crs.authid()))
+
+        # CHECK SURVEY POINTS
+        if pntlayer:
+            if crs != pntlayer.sourceCrs():
+                msg = 'ERROR: Layers have different CRS!'
+                feedback.reportError(msg)
+                return {}
+        elif not xyzfile:
+            msg = 'ERROR: Select a survey point layer or a XYZ file!'
+            feedback.reportError(msg)
+            return {}
+
+        # OUTPUT
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT,
+            context,
+            nodelayer.fields(),
+            nodelayer.wkbType(),
+            nodelayer.sourceCrs()
+            )
+        sink = BufferedSink(sink, 'Output layer')
+
+        # BUILD TIN
+        surface = TIN()
+        if pntlayer:
+            spoints = []
+            for f in pntlayer.getFeatures():
+                point = f.geometry().constGet()
+                if zfield:
+                    z = f[zfield]
+                else:
+                    z = point.z()
+                # SKIP NULL (QVARIANT), NOT NUMERIC AND NAN ELEVATIONS
+                try:
+                    z = float(z)
+                except (TypeError, ValueError):
+                    continue
+                if z != z:
+                    continue
+                spoints.append((point.x(), point.y(), z))
+            surface.from_points(spoints)
+        else:
+            surface.from_xyz(xyzfile)
+        msg = 'TIN faces: {}.'.format(surface.face_count())
+        feedback.pushInfo(msg)
+        feedback.setProgress(50)
+
+        # READ NODES
+        points = []
+        cnt = 0
+        for f in nodelayer.getFeatures():
+            point = f.geometry().asPoint().x(), f.geometry().asPoint().y()
+            points.append(point)
+        elevations = surface.elevations(points)
+
+        # SHOW PROGRESS
+        msg = 'Total nodes: {}.'.format(len(points))
+        feedback.pushInfo(msg)
+
+        # WRITE NODES
+        for f, z in zip(nodelayer.getFeatures(), elevations):
+            f[efield] = z
+            sink.addFeature(f)
+            if z is None:
+                cnt += 1
+
+        # SHOW PROGRESS
+        feedback.setProgress(100)
+        msg = 'Skipped nodes: {}.'.format(cnt)
+        feedback.pushInfo(msg)
+        sink.close(feedback)
+        feedback.pushInfo('='*40)
+
+        # PROCCES CANCELED
+        if feedback.isCanceled():
+            return {}
+
+        # OUTPUT
+        return {self.OUTPUT: dest_id}
@@ -30,15 +30,128 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
+import numpy as np
 from qgis.PyQt.QtCore import QCoreApplication
-from qgis.core import (QgsProcessing,
+from qgis.core import (Qgis,
+                       QgsProcessing,
                        QgsProcessingAlgorithm,
-                       QgsFeatureSink,
+                       QgsProcessingParameterEnum,
                        QgsProcessingParameterRasterLayer,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterFeatureSink,
-                       QgsProcessingParameterField
+                       QgsProcessingParameterField,
+                       QgsProcessingParameterNumber,
+                       QgsPointXY,
+                       QgsRasterRange,
+                       QgsRectangle
                       )
+from .utils_features import BufferedSink
+from .utils_raster import METHODS, RasterSampler
+
+# RASTER DATA TYPES AS NUMPY TYPES
+DTYPES = {
+    Qgis.Byte: np.uint8,
+    Qgis.UInt16: np.uint16,
+    Qgis.Int16: np.int16,
+    Qgis.UInt32: np.uint32,
+    Qgis.Int32: np.int32,
+    Qgis.Float32: np.float32,
+    Qgis.Float64: np.float64
+    }
+# QGIS >= 3.30
+if hasattr(Qgis.DataType, 'Int8'):
+    DTYPES[Qgis.DataType.Int8] = np.int8
+
+def in_range(values, value_range):
+    """
+    Return the cells of an array inside a raster range (NaN is unbounded).
+    """
+    low, high = value_range.min(), value_range.max()
+    bounds = value_range.bounds()
+    inside = np.ones(values.shape, dtype=bool)
+    if not np.isnan(low):
+        if bounds in [QgsRasterRange.IncludeMax, QgsRasterRange.Exclusive]:
+            inside &= values > low
+        else:
+            inside &= values >= low
+    if not np.isnan(high):
+        if bounds in [QgsRasterRange.IncludeMin, QgsRasterRange.Exclusive]:
+            inside &= values < high
+        else:
+            inside &= values <= high
+    return inside
+
+def block_array(block, ranges=()):
+    """
+    Return the values and the valid cells of a raster block as arrays.
+
+    Cells with the no data value, masked in the no data bitmap or inside
+    the user no data ranges are not valid. The block data type must be in
+    DTYPES.
+    """
+    shape = (block.height(), block.width())
+    if block.hasNoData() and not block.hasNoDataValue() \
+            and hasattr(block, 'as_numpy'):
+        # QGIS >= 3.34, NO DATA BITMAP AS A MASK BUILT IN C++
+        data = block.as_numpy(use_masking=True)
+        values = np.ma.getdata(data).astype(float)
+        valid = ~np.ma.getmaskarray(data) & ~np.isnan(values)
+    else:
+        dtype = DTYPES[block.dataType()]
+        values = np.frombuffer(bytes(block.data()), dtype=dtype)
+        values = values.reshape(shape).astype(float)
+        valid = ~np.isnan(values)
+        if block.hasNoDataValue():
+            valid &= values != block.noDataValue()
+        elif block.hasNoData():
+            # NO DATA BITMAP, ONLY READABLE CELL BY CELL IN OLDER QGIS
+            for row, col in np.argwhere(valid).tolist():
+                if block.isNoData(row, col):
+                    valid[row, col] = False
+    for value_range in ranges:
+        valid &= ~in_range(values, value_range)
+    return values, valid
+
+def sample_dem(demlayer, points, method='bilinear', budget=256*2**20,
+               progress=None):
+    """
+    Sample the first band of a DEM at points [(x, y), ..].
+
+    Return the sampler and the (elevations, found) arrays. Data types out
+    of DTYPES (complex, ARGB..) are sampled point by point with the
+    provider, without interpolation, and the sampler is None.
+    """
+    provider = demlayer.dataProvider()
+    if provider.dataType(1) not in DTYPES:
+        elevations = np.full(len(points), np.nan)
+        found = np.zeros(len(points), dtype=bool)
+        for k, (x, y) in enumerate(points):
+            value, ok = provider.sample(QgsPointXY(x, y), 1)
+            if ok and value == value:
+                elevations[k] = value
+                found[k] = True
+            if progress and k % 1000 == 0:
+                progress((k+1) / len(points))
+        return None, elevations, found
+    extent = provider.extent()
+    width, height = provider.xSize(), provider.ySize()
+    xres = extent.width() / width
+    yres = extent.height() / height
+    cols = [(x - extent.xMinimum()) / xres for x, y in points]
+    rows = [(extent.yMaximum() - y) / yres for x, y in points]
+    ranges = provider.userNoDataValues(1)
+
+    def read(col1, row1, col2, row2):
+        box = QgsRectangle(extent.xMinimum() + col1*xres,
+                           extent.yMaximum() - row2*yres,
+                           extent.xMinimum() + col2*xres,
+                           extent.yMaximum() - row1*yres)
+        return block_array(provider.block(1, box, col2-col1, row2-row1),
+                           ranges)
+
+    sampler = RasterSampler(read, width, height, method, budget=budget)
+    elevations, found = sampler.sample(cols, rows, progress)
+    return sampler, elevations, found
 
 class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
     """
@@ -49,6 +162,8 @@ class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
     NODE_INPUT = 'NODE_INPUT'
     DEM_INPUT = 'DEM_INPUT'
     ELEV_FIELD = 'ELEV_FIELD'
+    METHOD = 'METHOD'
+    MEMORY_BUDGET = 'MEMORY_BUDGET'
     OUTPUT = 'OUTPUT'
 
     def tr(self, string):
@@ -92,8 +207,18 @@ class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
         Returns a localised short help string for the algorithm.
         """
         return self.tr('''Set network node elevation from DEM in raster format.
+        The DEM is read by blocks and interpolated (nearest cell, bilinear or 
+        bicubic). Nodes on cells without data are skipped.
+
+        Tip: Blocks are kept in a cache limited by the memory budget, so only 
+        the area covered by the nodes is read.
         ===
         Añade elevación a los nodos de la red desde un DEM en formato raster.
+        El DEM se lee por bloques y se interpola (celda más próxima, bilineal 
+        o bicúbica). Los nodos sobre celdas sin datos se omiten.
+
+        Consejo: Los bloques se guardan en una caché limitada por el límite de 
+        memoria, de modo que solo se lee el área cubierta por los nodos.
         ''')
 
     def initAlgorithm(self, config=None):
@@ -122,6 +247,25 @@ class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
                 self.tr('DEM raster layer input')
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.METHOD,
+                self.tr('Interpolation'),
+                options=[self.tr('Nearest cell'),
+                         self.tr('Bilinear'),
+                         self.tr('Bicubic')],
+                defaultValue=1
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.MEMORY_BUDGET,
+                self.tr('DEM block cache memory budget (MB)'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=256,
+                minValue=1
+                )
+            )
 
         #ADD THE OUTPUT SINK
         self.addParameter(
@@ -140,6 +284,8 @@ class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
         nodelayer = self.parameterAsSource(parameters, self.NODE_INPUT, context)
         demlayer = self.parameterAsRasterLayer(parameters, self.DEM_INPUT, context)
         efield = self.parameterAsString(parameters, self.ELEV_FIELD, context)
+        method = METHODS[self.parameterAsEnum(parameters, self.METHOD, context)]
+        budget = self.parameterAsInt(parameters, self.MEMORY_BUDGET, context)
 
         # CHECK CRS
         crs = nodelayer.sourceCrs()
@@ -162,27 +308,42 @@ class ElevationFromRasterAlgorithm(QgsProcessingAlgorithm):
             nodelayer.wkbType(),
             nodelayer.sourceCrs()
             )
+        sink = BufferedSink(sink, 'Output layer')
+
+        # READ NODE POSITIONS
+        points = []
+        for feat in nodelayer.getFeatures():
+            point = feat.geometry().asPoint()
+            points.append((point.x(), point.y()))
 
-        # MAIN LOOP READ/WRITE POINTS
+        # SAMPLE THE DEM BY BLOCKS
+        sampler, elevations, found = sample_dem(
+            demlayer, points, method, budget*2**20,
+            lambda done: feedback.setProgress(90*done))
+        if sampler:
+            feedback.pushInfo('DEM blocks read: {}.'.format(sampler.reads))
+        else:
+            feedback.pushInfo('DEM sampled point by point (data type).')
+
+        # WRITE POINTS
         pcnt = 0
         scnt = 0
-
-        for feat in nodelayer.getFeatures():
-            val, res = demlayer.dataProvider().sample(feat.geometry().asPoint(), 1)
-            if res:
+        for index, feat in enumerate(nodelayer.getFeatures()):
+            if found[index]:
                 pcnt += 1
-                feat[efield] = val
-                sink.addFeature(feat, QgsFeatureSink.FastInsert)
+                feat[efield] = float(elevations[index])
+                sink.addFeature(feat)
             else:
                 scnt += 1
 
             # SHOW PROGRESS
             if (pcnt+scnt) % 100 == 0:
-                feedback.setProgress(100*(pcnt+scnt)/nodelayer.featureCount())
+                feedback.setProgress(90+10*(pcnt+scnt)/len(points))
         msg = 'Proccesed nodes: {}.'.format(pcnt)
         feedback.pushInfo(msg)
         msg = 'Skipped nodes: {}.'.format(scnt)
         feedback.pushInfo(msg)
+        sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -33,14 +33,18 @@ __revision__ = '$Format:%H$'
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.core import (QgsProcessing,
                        QgsProcessingAlgorithm,
-                       QgsFeatureSink,
                        QgsProcessingParameterFile,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterField,
+                       QgsProcessingParameterNumber,
                        QgsProcessingParameterString
                       )
-from . utils_tin import TIN
+from .utils_features import BufferedSink
+from . utils_tin import TIN, TiledTIN
+
+# NODES READ, SAMPLED AND WRITTEN AT ONCE
+CHUNK_SIZE = 10000
 
 class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
     """
@@ -52,6 +56,7 @@ class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
     ELEV_FIELD = 'ELEV_FIELD'
     TIN_INPUT = 'TIN_INPUT'
     SURFACE_NAME = 'SURFACE_NAME'
+    MEMORY_BUDGET = 'MEMORY_BUDGET'
     OUTPUT = 'OUTPUT'
 
     def tr(self, string):
@@ -97,10 +102,17 @@ class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
         return self.tr('''Set network node elevation from a TIN surface (LandXML).
                        
         http://www.landxml.org/
+
+        Tip: For large surfaces set a memory budget. The TIN is split into 
+        tiles stored on disk and only the tiles under the nodes are loaded.
         ===
         Añade elevación a los nodos de la red desde una superfice TIN (LandXML).
         
         http://www.landxml.org/
+
+        Consejo: Para superficies grandes defina un límite de memoria. El TIN
+        se divide en teselas almacenadas en disco y solo se cargan las 
+        teselas bajo los nodos.
         ''')
 
     def initAlgorithm(self, config=None):
@@ -140,6 +152,16 @@ class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
                 optional=True
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.MEMORY_BUDGET,
+                self.tr('Tiled TIN memory budget (MB, 0 = load whole TIN)'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=0,
+                minValue=0,
+                optional=True
+                )
+            )
 
         #ADD THE OUTPUT SINK
         self.addParameter(
@@ -159,6 +181,7 @@ class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
         efield = self.parameterAsString(parameters, self.ELEV_FIELD, context)
         tinlayer = self.parameterAsFile(parameters, self.TIN_INPUT, context)
         sname = self.parameterAsString(parameters, self.SURFACE_NAME, context)
+        budget = self.parameterAsInt(parameters, self.MEMORY_BUDGET, context)
 
         # SEND INFORMATION TO THE USER
         crs = nodelayer.sourceCrs()
@@ -174,34 +197,61 @@ class ElevationFromTINAlgorithm(QgsProcessingAlgorithm):
             nodelayer.wkbType(),
             nodelayer.sourceCrs()
             )
+        sink = BufferedSink(sink, 'Output layer')
 
-        # READ NODES
-        points = []
-        cnt = 0
+        # LOAD SURFACE
+        if budget > 0:
+            surface = TiledTIN(budget=budget*2**20)
+        else:
+            surface = TIN()
+        # TEMPORARY TILES ARE REMOVED EVEN ON ERROR
+        try:
+            surface.from_landxml(tinlayer, sname)
 
-        for f in  nodelayer.getFeatures():
-            point = f.geometry().asPoint().x(), f.geometry().asPoint().y()
-            points.append(point)
-        surface = TIN()
-        surface.from_landxml(tinlayer, sname)
-        elevations = surface.elevations(points)
+            # READ, SAMPLE AND WRITE NODES BY CHUNKS
+            def write(chunk):
+                points = []
+                for f in chunk:
+                    point = f.geometry().asPoint()
+                    points.append((point.x(), point.y()))
+                skipped = 0
+                for f, z in zip(chunk, surface.elevations(points)):
+                    f[efield] = z
+                    sink.addFeature(f)
+                    if z is None:
+                        skipped += 1
+                return skipped
 
-        # SHOW PROGRESS
-        msg = 'Total nodes: {}.'.format(len(points))
-        feedback.pushInfo(msg)
-        feedback.setProgress(50)
-
-        # WRITE NODES
-        for f, z in zip(nodelayer.getFeatures(), elevations):
-            f[efield] = z
-            sink.addFeature(f) # , QgsFeatureSink.FastInsert)
-            if not z:
-                cnt += 1
+            cnt = 0
+            processed = 0
+            total = nodelayer.featureCount()
+            chunk = []
+            for f in nodelayer.getFeatures():
+                chunk.append(f)
+                if len(chunk) == CHUNK_SIZE:
+                    cnt += write(chunk)
+                    processed += len(chunk)
+                    chunk = []
+                    if feedback.isCanceled():
+                        break
+                    feedback.setProgress(100*processed/max(total, 1))
+            if chunk:
+                cnt += write(chunk)
+                processed += len(chunk)
+            if budget > 0:
+                msg = 'Tiles loaded: {}.'.format(surface.loads)
+                feedback.pushInfo(msg)
+        finally:
+            if budget > 0:
+                surface.close()
 
         # SHOW PROGRESS
         feedback.setProgress(100)
+        msg = 'Total nodes: {}.'.format(processed)
+        feedback.pushInfo(msg)
         msg = 'Skipped nodes: {}.'.format(cnt)
         feedback.pushInfo(msg)
+        sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ WaterNetworkTools
+                                 A QGIS plugin
+ Water Network Modelling Utilities
+
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 by Andrés García Martínez
+        email                : ppnoptimizer@gmail.com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+
+import configparser
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (QgsField,
+                       QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingParameterFeatureSink,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterField,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterNumber
+                      )
+from .utils_features import BufferedSink
+from .utils_fire import EpanetError, run_pairs
+
+class FireFlowPairsAlgorithm(QgsProcessingAlgorithm):
+    """
+    Run a fire-flow simulation for every pair of hydrants.
+    """
+
+    # DEFINE CONSTANTS
+    PAIRS_INPUT = 'PAIRS_INPUT'
+    HYDRANT_1 = 'HYDRANT_1_FIELD'
+    HYDRANT_2 = 'HYDRANT_2_FIELD'
+    EPANET_INPUT = 'EPANET_INPUT'
+    FIRE_FLOW = 'FIRE_FLOW'
+    RESIDUAL_PRESSURE = 'RESIDUAL_PRESSURE'
+    WORKERS = 'WORKERS'
+    RESULT_OUTPUT = 'RESULT_OUTPUT'
+
+    def tr(self, string):
+        """
+        Returns a translatable string with the self.tr() function.
+        """
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        """
+        Create a instance and return a new copy of algorithm.
+        """
+        return FireFlowPairsAlgorithm()
+
+    def name(self):
+        """
+        Returns the unique algorithm name, used for identifying the algorithm.
+        """
+        return 'fire_flow_pairs'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name.
+        """
+        return self.tr('Fire flow of hydrant pairs')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to.
+        """
+        return self.tr('Fire')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to.
+        """
+        return 'fire'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short help string for the algorithm.
+        """
+        return self.tr('''Run a fire-flow simulation for every hydrant pair.
+        The fire flow is added to the base demand of both hydrants of the 
+        pair and the epanet model is solved in steady state.
+        The result is the pairs layer with the hydrant pressures, the minimum 
+        junction pressure and the available flow of the pair: the total flow 
+        of both hydrants that lowers the weakest one to the residual pressure.
+        Flow and pressure are in the units of the model.
+
+        Note: It is necessary to configure the access to epanet lib. 
+        Use Import/Configure epanet toolkit libary
+        ===
+        Simula el incendio de cada par de hidrantes.
+        El caudal de incendio se suma a la demanda base de ambos hidrantes 
+        del par y el modelo de epanet se resuelve en régimen permanente.
+        El resultado es la capa de pares con las presiones en los hidrantes, 
+        la presión mínima en los nudos y el caudal disponible del par: el 
+        caudal total de ambos hidrantes que reduce el más débil a la presión 
+        residual. Caudal y presión están en las unidades del modelo.
+
+        Nota: Es necesario configurar el acceso a epanet de forma previa.
+        Use Import/Configure epanet toolkit libary
+        ''')
+
+    def initAlgorithm(self, config=None):
+        """
+        Define the inputs and outputs of the algorithm.
+        """
+
+        # INPUT
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.PAIRS_INPUT,
+                self.tr('Hydrant pairs layer'),
+                types=[QgsProcessing.TypeVectorLine]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.HYDRANT_1,
+                self.tr('First hydrant field'),
+                'hydrant_1',
+                self.PAIRS_INPUT
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.HYDRANT_2,
+                self.tr('Second hydrant field'),
+                'hydrant_2',
+                self.PAIRS_INPUT
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.EPANET_INPUT,
+                self.tr('Epanet file'),
+                extension='inp'
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.FIRE_FLOW,
+                self.tr('Fire flow per hydrant'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=16.67,
+                minValue=0.0
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.RESIDUAL_PRESSURE,
+                self.tr('Residual pressure'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=10.0
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.WORKERS,
+                self.tr('Worker processes'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=1,
+                minValue=1
+                )
+            )
+
+        # ADD RESULT FEATURE SINK
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.RESULT_OUTPUT,
+                self.tr('Fire flow layer')
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        RUN PROCESS
+        """
+        # INPUT
+        pairs = self.parameterAsSource(parameters, self.PAIRS_INPUT, context)
+        field1 = self.parameterAsString(parameters, self.HYDRANT_1, context)
+        field2 = self.parameterAsString(parameters, self.HYDRANT_2, context)
+        epanet_file = self.parameterAsFile(parameters, self.EPANET_INPUT, context)
+        flow = self.parameterAsDouble(parameters, self.FIRE_FLOW, context)
+        residual = self.parameterAsDouble(parameters, self.RESIDUAL_PRESSURE,
+                                          context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+
+        # OUTPUT LAYER
+        fields = pairs.fields()
+        fields.append(QgsField('fire_flow', QVariant.Double))
+        fields.append(QgsField('pressure_1', QVariant.Double))
+        fields.append(QgsField('pressure_2', QVariant.Double))
+        fields.append(QgsField('min_pressure', QVariant.Double))
+        fields.append(QgsField('min_node', QVariant.String))
+        fields.append(QgsField('available', QVariant.Double))
+        fields.append(QgsField('error', QVariant.String))
+        (result_sink, result_id) = self.parameterAsSink(
+            parameters,
+            self.RESULT_OUTPUT,
+            context,
+            fields,
+            pairs.wkbType(),
+            pairs.sourceCrs()
+            )
+        result_sink = BufferedSink(result_sink, 'Fire flow layer')
+
+        # SEND INFORMATION TO THE USER
+        feedback.pushInfo('='*40)
+
+        # EPANET LIB
+        config = configparser.ConfigParser()
+        ini_file = sys.path[0] + '/toolkit.ini'
+        config.read(ini_file)
+        try:
+            lib_file = config['EPANET']['lib']
+        except KeyError:
+            lib_file = ''
+        if not lib_file:
+            feedback.reportError('ERROR: Configure epanet library!')
+            return {}
+        feedback.pushInfo(f'Epanet library file: {lib_file}')
+        feedback.pushInfo(f'Processing: {epanet_file}')
+
+        # READ PAIRS
+        features = {}
+        cases = []
+        for f in pairs.getFeatures():
+            features[f.id()] = f
+            cases.append((f.id(), f[field1], f[field2], flow, residual))
+        feedback.pushInfo('Pairs #: {}.'.format(len(cases)))
+
+        # RUN CASES AND WRITE RESULTS
+        keys = ['pressure_1', 'pressure_2', 'min_pressure', 'min_node',
+                'available']
+        cnt = 0
+        failed = 0
+        results = run_pairs(lib_file, epanet_file, cases, workers,
+                            lambda done: feedback.setProgress(100*done))
+        try:
+            for label, result in results:
+                f = features.pop(label)
+                attr = f.attributes() + [flow]
+                attr.extend(result.get(key) for key in keys)
+                attr.append(result['error'])
+                f.setFields(fields, False)
+                f.setAttributes(attr)
+                result_sink.addFeature(f)
+                cnt += 1
+                if result['error']:
+                    failed += 1
+                if feedback.isCanceled():
+                    break
+        except (EpanetError, OSError, BrokenProcessPool) as error:
+            feedback.reportError('ERROR: {}'.format(error))
+            return {}
+        finally:
+            # STOP THE QUEUED CASES IF CANCELED
+            results.close()
+
+        # SHOW PROGRESS
+        feedback.pushInfo('Fire flow cases #: {}.'.format(cnt))
+        if failed:
+            feedback.pushInfo('WARNING: Failed cases #: {}.'.format(failed))
+        result_sink.close(feedback)
+        feedback.pushInfo('='*40)
+
+        # PROCCES CANCELED
+        if feedback.isCanceled():
+            return {}
+
+        # OUTPUT
+        return {self.RESULT_OUTPUT: result_id}
@@ -37,6 +37,7 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterFileDestination
                       )
 from . import utils_core as tools
+from .utils_features import attribute_rows
 
 class GraphFromNetworkAlgorithm(QgsProcessingAlgorithm):
     """
@@ -146,10 +147,10 @@ class GraphFromNetworkAlgorithm(QgsProcessingAlgorithm):
 
         # GENERATE NETWORK
         net = tools.WntNetwork()
-        for f in nodes.getFeatures():
-            net.add_node(tools.WntNode(f['id']))
-        for f in links.getFeatures():
-            net.add_link(tools.WntLink(f['id'], f['start'], f['end']))
+        for (nid,) in attribute_rows(nodes, ['id']):
+            net.add_node(tools.WntNode(nid))
+        for lid, start, end in attribute_rows(links, ['id', 'start', 'end']):
+            net.add_link(tools.WntLink(lid, start, end))
 
         # GENERATE GRAPH
         net.to_tgf(graphfile)
@@ -43,6 +43,10 @@ from qgis.core import (QgsFeature,
                        QgsProcessingParameterField,
                        QgsWkbTypes
                       )
+from .utils_features import BufferedSink
+from .utils_graph import network_pairs
+from .utils_grid import close_pairs
+from .utils_segments import SegmentBuffer
 
 class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
     """
@@ -53,6 +57,7 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
     HYD_INPUT = 'HYDRANT_INPUT'
     ID_FIELD = 'HIDRANT_ID_FIELD'
     MAX_DIST = 'MAX_DIST'
+    PIPE_INPUT = 'PIPE_INPUT'
     PAIRS_OUTPUT = 'PAIRS_OUTPUT'
 
     def tr(self, string):
@@ -99,13 +104,19 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
         The result is a line layer containing lines (it allows to check that 
         they run over public space) and node labels.
         
-        Points separated more than max distance are discarded.        
+        Points separated more than max distance are discarded.
+
+        If a pipe layer is set, hydrants are snapped to the nearest pipe and
+        the distance is measured along the pipes.
         ===
         Genera un pare de hidrantes a partir de una capa de nodos.
         El resultado es una capa de líneas (que permite comprobar que estas 
         discurren por espacio público).
         
         Los puntos separados más de la distancia máxima son descartados.
+
+        Si se indica una capa de tuberías, los hidrantes se proyectan sobre 
+        la tubería más próxima y la distancia se mide a lo largo de la red.
         ''')
 
     def initAlgorithm(self, config=None):
@@ -138,6 +149,14 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
                 maxValue=10000
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.PIPE_INPUT,
+                self.tr('Pipe layer (network distance)'),
+                types=[QgsProcessing.TypeVectorLine],
+                optional=True
+                )
+            )
         # ADD PAIRS FEATURE SINK
         self.addParameter(
             QgsProcessingParameterFeatureSink(
@@ -154,6 +173,7 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
         hydlayer = self.parameterAsSource(parameters, self.HYD_INPUT, context)
         idfield = self.parameterAsString(parameters, self.ID_FIELD, context)
         maxdist = self.parameterAsDouble(parameters, self.MAX_DIST, context)
+        pipelayer = self.parameterAsSource(parameters, self.PIPE_INPUT, context)
 
         # SEND INFORMATION TO THE USER
         feedback.pushInfo('='*40)
@@ -165,17 +185,9 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
 
         # READ HYDRANTS
         hydrants = []
-        pairs = []
         for f in hydlayer.getFeatures():
             hydrants.append((f[idfield], f.geometry().asPoint()))
 
-        # CALCULATE PAIRS
-        for i in range(len(hydrants)-1):
-            for j in range(i+1, len(hydrants)):
-                dist = hydrants[i][1].distance(hydrants[j][1])
-                if dist <= maxdist:
-                    pairs.append((hydrants[i], hydrants[j], dist))
-
         # SHOW INFO
         feedback.pushInfo('Read: {} hydrants.'.format(len(hydrants)))
 
@@ -193,25 +205,57 @@ class HydrantPairsAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             hydlayer.sourceCrs()
             )
+        pairs_sink = BufferedSink(pairs_sink, 'Pairs layer')
 
-        # SHOW PROGRESS
-        feedback.setProgress(50)
+        # CALCULATE PAIRS (NEIGHBOURING GRID CELLS OR ALONG THE PIPES)
+        points = [(point.x(), point.y()) for hid, point in hydrants]
+        if pipelayer:
+            linestrings = []
+            for f in pipelayer.getFeatures():
+                geometry = f.geometry()
+                if geometry.isMultipart():
+                    parts = geometry.asMultiPolyline()
+                else:
+                    parts = [geometry.asPolyline()]
+                for part in parts:
+                    linestrings.append([(v.x(), v.y()) for v in part])
+            buffer = SegmentBuffer(linestrings)
+            found = buffer.nearest(points)
+            snapped = []
+            for line, chainage in zip(found['line'], found['chainage']):
+                if line < 0:
+                    snapped.append((None, 0.0))
+                else:
+                    snapped.append((int(line), float(chainage)))
+            if len(points) and len(buffer):
+                msg = 'Max snapping distance: {:.3f}.'
+                feedback.pushInfo(msg.format(float(found['distance'].max())))
+            pairs = network_pairs(linestrings, snapped, maxdist)
+        else:
+            pairs = close_pairs(points, maxdist)
 
         # ADD FEATURES
         f = QgsFeature()
         cnt = 0
-        for pair in pairs:
-            p1 = QgsPoint(pair[0][1])
-            p2 = QgsPoint(pair[1][1])
+        for i, j, dist in pairs:
+            p1 = QgsPoint(hydrants[i][1])
+            p2 = QgsPoint(hydrants[j][1])
             f.setGeometry(QgsLineString([p1, p2]))
-            f.setAttributes([str(cnt), pair[0][0], pair[1][0], pair[2]])
+            f.setAttributes([str(cnt), hydrants[i][0], hydrants[j][0], dist])
             pairs_sink.addFeature(f)
             cnt += 1
 
+            # SHOW PROGRESS
+            if cnt % 1000 == 0:
+                if feedback.isCanceled():
+                    break
+                feedback.setProgress(100*(i+1)/len(hydrants))
+
         # SHOW PROGRESS
         feedback.setProgress(100)
         feedback.pushInfo('Pairs #: {}.'.format(cnt))
         feedback.pushInfo('Pairs layer was generated successfully.')
+        pairs_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -37,6 +37,7 @@ from qgis.core import (QgsFeature,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterFeatureSource
                       )
+from .utils_features import BufferedSink
 
 class MergeNetworksAlgorithm(QgsProcessingAlgorithm):
     """
@@ -193,6 +194,7 @@ class MergeNetworksAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             crs
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         # GENERATE MERGED LINK LAYER
         newfields = l1lay.fields()
@@ -207,6 +209,7 @@ class MergeNetworksAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # ADD FEATURES
         f = QgsFeature()
@@ -275,6 +278,8 @@ class MergeNetworksAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo(msg)
         msg = 'Connection nodes: {}'.format(over, nofl)
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
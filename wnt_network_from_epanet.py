@@ -42,6 +42,7 @@ from qgis.core import (QgsProcessingAlgorithm,
                        QgsWkbTypes
                       )
 from . import utils_core as tools
+from .utils_features import BufferedSink
 
 class NetworkFromEpanetAlgorithm(QgsProcessingAlgorithm):
     """
@@ -174,6 +175,7 @@ class NetworkFromEpanetAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             crs
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         # ADD NODES
         ncnt = 0
@@ -209,6 +211,7 @@ class NetworkFromEpanetAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # ADD LINKS
         lcnt = 0
@@ -251,6 +254,8 @@ class NetworkFromEpanetAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo(msg)
         msg = 'Added: {} links.'.format(lcnt)
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -41,6 +41,7 @@ from qgis.core import (QgsCoordinateReferenceSystem,
                        QgsGeometry,
                        QgsWkbTypes
                       )
+from .utils_features import BufferedSink
 from . import utils_landxml as landxml
 
 class NetworkFromLandXMLAlgorithm(QgsProcessingAlgorithm):
@@ -165,6 +166,7 @@ class NetworkFromLandXMLAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             crs
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         newfields = QgsFields()
         newfields.append(QgsField("network", QVariant.String))
@@ -190,6 +192,7 @@ class NetworkFromLandXMLAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         netcnt = nodcnt = lnkcnt = 0
         # ADD NETWORK
@@ -252,6 +255,8 @@ class NetworkFromLandXMLAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo(msg)
         msg = 'Added: {} links.'.format(lnkcnt)
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -37,6 +37,7 @@ from qgis.core import (QgsFeature,
                        QgsWkbTypes,
                        QgsProcessing,
                        QgsProcessingAlgorithm,
+                       QgsProcessingParameterBoolean,
                        QgsProcessingParameterNumber,
                        QgsProcessingParameterDistance,
                        QgsProcessingParameterString,
@@ -45,6 +46,8 @@ from qgis.core import (QgsFeature,
                        QgsPointXY
                       )
 from . import utils_core as tools
+from .utils_features import BufferedSink
+from . import utils_split as split
 
 class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
     """
@@ -54,6 +57,7 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
     # DEFINE CONSTANTS
     INPUT = 'INPUT'
     TOLERANCE = 'TOLERANCE'
+    NODE_CROSSINGS = 'NODE_CROSSINGS'
     NODE_MASK = 'NODE_MASK'
     NODE_INI = 'NODE_INI'
     NODE_INC = 'NODE_INC'
@@ -106,6 +110,8 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
         return self.tr('''Generate an epanet network from lines.
         The generated network consists of two layers: nodes and links.
         Line ends not separated more than tolerance are merged into a node.
+        Optionally, lines are first split at crossings and where a line end 
+        lies within tolerance of another line (T-junctions).
         The node layer contains the fields: *id *type *elevation
         The line layer contains the fields: *id *start *end *type *length
         
@@ -130,6 +136,8 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
         La red generada consiste en dos capas: una de nodos y otra de líneas.
         Los extremos de línea no distanciados más de la tolerancia se fusionan 
         en un nodo. 
+        Opcionalmente, las líneas se parten antes en los cruces y donde el 
+        extremo de una línea dista menos de la tolerancia de otra (uniones T).
         La capa de nodos contendrá los campos: *id *type *elevation
         La capa de línea contendrá los campos: *id *start *end *type *length
         
@@ -172,6 +180,13 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
                 maxValue=1.0
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.NODE_CROSSINGS,
+                self.tr('Split lines at crossings and T-junctions'),
+                defaultValue=False
+                )
+            )
         self.addParameter(
             QgsProcessingParameterString(
                 self.NODE_MASK,
@@ -240,6 +255,7 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
         # INPUT
         linelayer = self.parameterAsSource(parameters, self.INPUT, context)
         tol = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+        noding = self.parameterAsBool(parameters, self.NODE_CROSSINGS, context)
         nmask = self.parameterAsString(parameters, self.NODE_MASK, context)
         nini = self.parameterAsInt(parameters, self.NODE_INI, context)
         ninc = self.parameterAsInt(parameters, self.NODE_INC, context)
@@ -260,11 +276,13 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
 
         # READ LINESTRINGS AS WKT
         lines = []
+        attributes = []
         for feature in linelayer.getFeatures():
             line = []
             for point in feature.geometry().asPolyline():
                 line.append((point.x(), point.y()))
             lines.append(line)
+            attributes.append(feature.attributes())
         for line in lines:
             if tools.dist2p(line[0], line[-1]) < tol:
                 feedback.reportError('ERROR: Looped LineString!')
@@ -273,6 +291,13 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
         # SHOW INFO
         feedback.pushInfo('Read: {} LineStrings.'.format(len(lines)))
 
+        # SPLIT AT CROSSINGS AND T-JUNCTIONS
+        sources = list(range(len(lines)))
+        if noding:
+            lines, sources = split.node_linestrings(lines, tol)
+            msg = 'Split at crossings: {} LineStrings.'.format(len(lines))
+            feedback.pushInfo(msg)
+
         # CONFIG
         def n_format(index):
             return tools.format_id(nini + index*ninc, nmask)
@@ -296,6 +321,7 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             linelayer.sourceCrs()
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         # ADD FEATURES
         ncnt = 0
@@ -327,21 +353,21 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             linelayer.sourceCrs()
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # ADD FEATURES
         lcnt = 0
         g = QgsFeature()
-        for f in linelayer.getFeatures():
-            link = links[lcnt]
+        for link in links:
             linkid = l_format(lcnt)
             start = n_format(link[0])
             end = n_format(link[1])
             poly = []
-            for x, y in links[lcnt][2][:]:
+            for x, y in link[2][:]:
                 poly.append(QgsPointXY(x, y))
             length = tools.length2d(poly)
             attr = [linkid, start, end, 'PIPE', length]
-            attr.extend(f.attributes())
+            attr.extend(attributes[sources[lcnt]])
             g.setGeometry(QgsGeometry.fromPolylineXY(poly))
             g.setAttributes(attr)
             link_sink.addFeature(g)
@@ -353,6 +379,8 @@ class NetworkFromLinesAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo('Network was generated successfully.')
         feedback.pushInfo('Node number: {}.'.format(ncnt))
         feedback.pushInfo('Link number: {}.'.format(lcnt))
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
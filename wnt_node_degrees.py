@@ -39,6 +39,7 @@ from qgis.core import (QgsField,
                        QgsWkbTypes
                        )
 from . import utils_core as tools
+from .utils_features import BufferedSink, attribute_rows
 
 class NodeDegreesAlgorithm(QgsProcessingAlgorithm):
     """
@@ -159,6 +160,7 @@ class NodeDegreesAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             nodelay.sourceCrs()
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         # DEFINE NETWORK
         net = tools.WntNetwork()
@@ -169,9 +171,9 @@ class NodeDegreesAlgorithm(QgsProcessingAlgorithm):
 
         # ADD NODES
         cnt = 0
-        for f in nodelay.getFeatures():
+        for (nid,) in attribute_rows(nodelay, ['id']):
             cnt += 1
-            net.add_node(tools.WntNode(f['id']))
+            net.add_node(tools.WntNode(nid))
 
             # SHOW PROGRESS
             if cnt % 100 == 0:
@@ -179,9 +181,9 @@ class NodeDegreesAlgorithm(QgsProcessingAlgorithm):
 
         # ADD LINKS
         cnt = 0
-        for f in linklay.getFeatures():
+        for lid, start, end in attribute_rows(linklay, ['id', 'start', 'end']):
             cnt += 1
-            net.add_link(tools.WntLink(f['id'], f['start'], f['end']))
+            net.add_link(tools.WntLink(lid, start, end))
 
             # SHOW POROGRESS
             if cnt % 100 == 0:
@@ -212,6 +214,7 @@ class NodeDegreesAlgorithm(QgsProcessingAlgorithm):
         msg = 'Degree min: {}. Degree max: {}'
         msg = msg.format(min(degrees.values()), max(degrees.values()))
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
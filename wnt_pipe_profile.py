@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ WaterNetworkTools
+                                 A QGIS plugin
+ Water Network Modelling Utilities
+
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 by Andrés García Martínez
+        email                : ppnoptimizer@gmail.com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Andrés García Martínez'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Andrés García Martínez'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (QgsFeature,
+                       QgsField,
+                       QgsFields,
+                       QgsGeometry,
+                       QgsPointXY,
+                       QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingParameterDistance,
+                       QgsProcessingParameterEnum,
+                       QgsProcessingParameterFeatureSink,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterRasterLayer,
+                       QgsProcessingParameterString,
+                       QgsWkbTypes
+                      )
+from .utils_features import BufferedSink
+from .utils_profile import densify, extremes
+from .utils_raster import METHODS
+from .utils_tin import TIN
+from .wnt_elevation_from_raster import sample_dem
+
+class PipeProfileAlgorithm(QgsProcessingAlgorithm):
+    """
+    Sample the ground profile along links and find high and low points.
+    """
+
+    # DEFINE CONSTANTS
+    LINK_INPUT = 'LINK_INPUT'
+    DEM_INPUT = 'DEM_INPUT'
+    METHOD = 'METHOD'
+    MEMORY_BUDGET = 'MEMORY_BUDGET'
+    TIN_INPUT = 'TIN_INPUT'
+    SURFACE_NAME = 'SURFACE_NAME'
+    INTERVAL = 'INTERVAL'
+    TOLERANCE = 'TOLERANCE'
+    LINK_OUTPUT = 'LINK_OUTPUT'
+    POINT_OUTPUT = 'POINT_OUTPUT'
+
+    def tr(self, string):
+        """
+        Returns a translatable string with the self.tr() function.
+        """
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        """
+        Create a instance and return a new copy of algorithm.
+        """
+        return PipeProfileAlgorithm()
+
+    def name(self):
+        """
+        Returns the unique algorithm name, used for identifying the algorithm.
+        """
+        return 'pipe_profile'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name.
+        """
+        return self.tr('Pipe profile high and low points')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to.
+        """
+        return self.tr('Modify')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to.
+        """
+        return 'modify'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short help string for the algorithm.
+        """
+        return self.tr('''Sample the ground profile along links and find high 
+        and low points (air valve and washout locations).
+        Every link is densified at the interval, and all the points are 
+        sampled at once from a DEM (raster) or a TIN (LandXML).
+        A high (low) point rises (falls) more than the tolerance from the 
+        previous extreme and falls (rises) more than it before the next one.
+        The result is the link layer with the maximum elevation and the count 
+        of high and low points, and a layer of high and low points.
+        The link layer has to have an id field.
+        Tip: DEM blocks are kept in a cache limited by the memory budget.
+        ===
+        Muestrea el perfil del terreno a lo largo de las líneas y localiza 
+        los puntos altos y bajos (ventosas y desagües).
+        Cada línea se densifica según el intervalo y todos los puntos se 
+        muestrean a la vez desde un DEM (raster) o un TIN (LandXML).
+        Un punto alto (bajo) sube (baja) más que la tolerancia desde el 
+        extremo anterior y baja (sube) más que ella antes del siguiente.
+        El resultado es la capa de líneas con la elevación máxima y el número 
+        de puntos altos y bajos, y una capa de puntos altos y bajos.
+        La capa de líneas debe tener un campo id.
+        Consejo: Los bloques del DEM se guardan en una caché limitada por el 
+        límite de memoria.
+        ''')
+
+    def initAlgorithm(self, config=None):
+        """
+        Define the inputs and outputs of the algorithm.
+        """
+
+        # INPUT
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.LINK_INPUT,
+                self.tr('Link layer'),
+                types=[QgsProcessing.TypeVectorLine]
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.DEM_INPUT,
+                self.tr('DEM raster layer input'),
+                optional=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.METHOD,
+                self.tr('DEM interpolation'),
+                options=[self.tr('Nearest cell'),
+                         self.tr('Bilinear'),
+                         self.tr('Bicubic')],
+                defaultValue=1
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.MEMORY_BUDGET,
+                self.tr('DEM block cache memory budget (MB)'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=256,
+                minValue=1
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.TIN_INPUT,
+                self.tr('landXML file'),
+                extension='xml',
+                optional=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.SURFACE_NAME,
+                self.tr('Surface name (if empty, first found)'),
+                defaultValue='',
+                multiLine=False,
+                optional=True
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterDistance(
+                self.INTERVAL,
+                self.tr('Sampling interval'),
+                defaultValue=5.0,
+                minValue=0.01,
+                parentParameterName=self.LINK_INPUT
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.TOLERANCE,
+                self.tr('Elevation tolerance'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.5,
+                minValue=0.0
+                )
+            )
+
+        # ADD FEATURE SINKS
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.LINK_OUTPUT,
+                self.tr('Link profile layer')
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.POINT_OUTPUT,
+                self.tr('High and low point layer'),
+                QgsProcessing.TypeVectorPoint
+                )
+            )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        RUN PROCESS
+        """
+        # INPUT
+        linklayer = self.parameterAsSource(parameters, self.LINK_INPUT, context)
+        demlayer = self.parameterAsRasterLayer(parameters, self.DEM_INPUT,
+                                               context)
+        method = METHODS[self.parameterAsEnum(parameters, self.METHOD, context)]
+        budget = self.parameterAsInt(parameters, self.MEMORY_BUDGET, context)
+        tinlayer = self.parameterAsFile(parameters, self.TIN_INPUT, context)
+        sname = self.parameterAsString(parameters, self.SURFACE_NAME, context)
+        interval = self.parameterAsDouble(parameters, self.INTERVAL, context)
+        tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+
+        # CHECK SURFACE AND CRS
+        crs = linklayer.sourceCrs()
+        if not demlayer and not tinlayer:
+            feedback.reportError('ERROR: Set a DEM or a TIN!')
+            return {}
+        if demlayer and crs != demlayer.crs():
+            msg = 'ERROR: Layers have different CRS!'
+            feedback.reportError(msg)
+            return {}
+        feedback.pushInfo('='*40)
+        feedback.pushInfo('CRS is {}'.format(crs.authid()))
+
+        # OUTPUT LAYERS
+        link_fields = linklayer.fields()
+        link_fields.append(QgsField('max_elev', QVariant.Double))
+        link_fields.append(QgsField('max_chain', QVariant.Double))
+        link_fields.append(QgsField('high_pts', QVariant.Int))
+        link_fields.append(QgsField('low_pts', QVariant.Int))
+        (link_sink, link_id) = self.parameterAsSink(
+            parameters,
+            self.LINK_OUTPUT,
+            context,
+            link_fields,
+            linklayer.wkbType(),
+            crs
+            )
+        link_sink = BufferedSink(link_sink, 'Link layer')
+        fields = QgsFields()
+        fields.append(QgsField('link', QVariant.String))
+        fields.append(QgsField('type', QVariant.String))
+        fields.append(QgsField('chainage', QVariant.Double))
+        fields.append(QgsField('elevation', QVariant.Double))
+        (point_sink, point_id) = self.parameterAsSink(
+            parameters,
+            self.POINT_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.Point,
+            crs
+            )
+        point_sink = BufferedSink(point_sink, 'Point layer')
+
+        # DENSIFY LINKS
+        profiles = []
+        points = []
+        for f in linklayer.getFeatures():
+            geometry = f.geometry()
+            if geometry.isMultipart():
+                parts = geometry.asMultiPolyline()
+            else:
+                parts = [geometry.asPolyline()]
+            chainages = []
+            start = 0.0
+            for part in parts:
+                profile = densify([(v.x(), v.y()) for v in part], interval)
+                points += [(x, y) for x, y, c in profile]
+                chainages += [start+c for x, y, c in profile]
+                if profile:
+                    start += profile[-1][2]
+            profiles.append((len(points)-len(chainages), chainages))
+        feedback.pushInfo('Profile points #: {}.'.format(len(points)))
+        feedback.setProgress(10)
+
+        # SAMPLE ALL THE POINTS AT ONCE
+        if demlayer:
+            sampler, values, found = sample_dem(
+                demlayer, points, method, budget*2**20,
+                lambda done: feedback.setProgress(10+70*done))
+            elevations = [float(z) if ok else None
+                          for z, ok in zip(values, found)]
+            if sampler:
+                msg = 'DEM blocks read: {}.'.format(sampler.reads)
+            else:
+                msg = 'DEM sampled point by point (data type).'
+            feedback.pushInfo(msg)
+        else:
+            surface = TIN()
+            surface.from_landxml(tinlayer, sname)
+            elevations = surface.elevations(points)
+        feedback.setProgress(80)
+
+        # HIGH AND LOW POINTS
+        highs = 0
+        lows = 0
+        skipped = 0
+        p = QgsFeature()
+        for (start, chainages), f in zip(profiles, linklayer.getFeatures()):
+            profile = elevations[start:start+len(chainages)]
+            known = [(z, c) for z, c in zip(profile, chainages) if z is not None]
+            found = extremes(profile, tolerance)
+            kinds = [kind for index, kind in found]
+            attr = f.attributes()
+            if known:
+                top = max(known, key=lambda d: d[0])
+                attr += [top[0], top[1]]
+            else:
+                attr += [None, None]
+                skipped += 1
+            attr += [kinds.count('HIGH'), kinds.count('LOW')]
+            f.setFields(link_fields, False)
+            f.setAttributes(attr)
+            link_sink.addFeature(f)
+            for index, kind in found:
+                x, y = points[start+index]
+                p.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+                p.setAttributes([str(f['id']), kind, chainages[index],
+                                 profile[index]])
+                point_sink.addFeature(p)
+            highs += kinds.count('HIGH')
+            lows += kinds.count('LOW')
+
+        # SHOW PROGRESS
+        feedback.setProgress(100)
+        feedback.pushInfo('High points #: {}.'.format(highs))
+        feedback.pushInfo('Low points #: {}.'.format(lows))
+        feedback.pushInfo('Links out of the surface #: {}.'.format(skipped))
+        link_sink.close(feedback)
+        point_sink.close(feedback)
+        feedback.pushInfo('='*40)
+
+        # PROCCES CANCELED
+        if feedback.isCanceled():
+            return {}
+
+        # OUTPUT
+        return {self.LINK_OUTPUT: link_id, self.POINT_OUTPUT: point_id}
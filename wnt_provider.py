@@ -32,13 +32,17 @@ __revision__ = '$Format:%H$'
 
 from qgis.core import QgsProcessingProvider
 from .wnt_assign_demand import AssignDemandAlgorithm
+from .wnt_assign_demand_by_area import AssignDemandByAreaAlgorithm
+from .wnt_assign_demand_to_pipes import AssignDemandToPipesAlgorithm
 from .wnt_classify import ClassifyAlgorithm
 from .wnt_config_toolkit import ConfigToolkitAlgorithm
 from .wnt_connect_by_distance import ConnectByDistanceAlgorithm
+from .wnt_elevation_from_points import ElevationFromPointsAlgorithm
 from .wnt_elevation_from_raster import ElevationFromRasterAlgorithm
 from .wnt_elevation_from_tin import ElevationFromTINAlgorithm
 from .wnt_epanet_from_network import EpanetFromNetworkAlgorithm
 from .wnt_graph_from_network import GraphFromNetworkAlgorithm
+from .wnt_fire_flow_pairs import FireFlowPairsAlgorithm
 from .wnt_hydrant_pairs import HydrantPairsAlgorithm
 from .wnt_merge_networks import MergeNetworksAlgorithm
 from .wnt_network_from_epanet import NetworkFromEpanetAlgorithm
@@ -49,6 +53,7 @@ from .wnt_ppno_from_network import PpnoFromNetworkAlgorithm
 from .wnt_results_from_epanet import ResultsFromEpanetAlgorithm
 from .wnt_scn_from_demands import ScnFromDemandsAlgorithm
 from .wnt_scn_from_pipe_properties import ScnFromPipePropertiesAlgorithm
+from .wnt_pipe_profile import PipeProfileAlgorithm
 from .wnt_split_lines_at_points import SplitLinesAtPointsAlgorithm
 from .wnt_validate import ValidateAlgorithm
 from .wnt_update_assignment import UpdateAssignmentAlgorithm
@@ -73,14 +78,19 @@ class WaterNetworkToolsProvider(QgsProcessingProvider):
         Loads all algorithms belonging to this provider.
         """
         self.addAlgorithm(AssignDemandAlgorithm())
+        self.addAlgorithm(AssignDemandByAreaAlgorithm())
+        self.addAlgorithm(AssignDemandToPipesAlgorithm())
         self.addAlgorithm(ClassifyAlgorithm())
         self.addAlgorithm(ConfigToolkitAlgorithm())
         self.addAlgorithm(ConnectByDistanceAlgorithm())
+        self.addAlgorithm(ElevationFromPointsAlgorithm())
         self.addAlgorithm(ElevationFromRasterAlgorithm())
         self.addAlgorithm(ElevationFromTINAlgorithm())
+        self.addAlgorithm(PipeProfileAlgorithm())
         self.addAlgorithm(EpanetFromNetworkAlgorithm())
         self.addAlgorithm(GraphFromNetworkAlgorithm())
         self.addAlgorithm(HydrantPairsAlgorithm())
+        self.addAlgorithm(FireFlowPairsAlgorithm())
         self.addAlgorithm(MergeNetworksAlgorithm())
         self.addAlgorithm(NetworkFromEpanetAlgorithm())
         self.addAlgorithm(NetworkFromLandXMLAlgorithm())
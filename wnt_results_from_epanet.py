@@ -40,7 +40,10 @@ from qgis.core import (QgsFeature,
                        QgsFields,
                        QgsProcessingAlgorithm,
                        QgsProcessingParameterFeatureSink,
-                       QgsProcessingParameterFile)
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterNumber)
+from .utils_binout import OPEN_STATUS, OutputFile
+from .utils_features import BufferedSink
 
 
 # EPANET TOOLKIT CONSTANTS
@@ -55,9 +58,43 @@ EN_HEADLOSS = 10
 EN_STATUS = 11
 EN_SETTING = 12
 EN_ENERGY = 13
-MAX_LABEL_LEN = 16
+MAX_LABEL_LEN = 31
 NOSAVE = 0
 
+def get_ids(epanet_lib, kind, count):
+    """
+    Return (err, ids) of every node or link, kind is 'node' or 'link'.
+    Only the characters before the NUL terminator are decoded.
+    """
+    getter = getattr(epanet_lib, 'ENget{}id'.format(kind))
+    id_ = ctypes.create_string_buffer(MAX_LABEL_LEN + 1)
+    ids = []
+    for index in range(1, count + 1):
+        err = getter(index, id_)
+        if err:
+            return err, ids
+        ids.append(id_.value.decode('utf-8'))
+    return 0, ids
+
+def get_values(epanet_lib, kind, parameter, count):
+    """
+    Return (err, values) of a parameter for every node or link, kind is
+    'node' or 'link'. The bulk getter of epanet 2.2 is used if the library
+    has it, otherwise every element is read with a call.
+    """
+    values = (ctypes.c_float * count)()
+    bulk = getattr(epanet_lib, 'ENget{}values'.format(kind), None)
+    if bulk is not None:
+        return bulk(parameter, values), values
+    single = getattr(epanet_lib, 'ENget{}value'.format(kind))
+    variable = ctypes.c_float()
+    for index in range(1, count + 1):
+        err = single(index, parameter, ctypes.byref(variable))
+        if err:
+            return err, values
+        values[index-1] = variable.value
+    return 0, values
+
 class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
     """
     Import epanet result from epanet toolkit.
@@ -65,6 +102,9 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
 
     # DEFINE CONSTANTS
     INPUT = 'INPUT'
+    BINARY_INPUT = 'BINARY_INPUT'
+    START_TIME = 'START_TIME'
+    END_TIME = 'END_TIME'
     NODE_OUTPUT = 'NODE_OUTPUT'
     LINK_OUTPUT = 'LINK_OUTPUT'
 
@@ -112,6 +152,13 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
         Imported data:
         Nodes: *time *demand *head *pressure
         Links: *time *flow *velocity *headloss *status *setting *energy
+
+        If a binary output file (.out) of a previous run is set, results are 
+        read from it without simulating. Pipe headlosses are converted from 
+        the stored per 1000 length units value to the absolute headloss. The 
+        file does not store the pump energy of every period, so it is 
+        estimated with the average efficiency of every pump in the run.
+        Only the results between the start and end times are imported.
         
         Note: It is necessary to configure the access to epanet lib. 
         Use Import/Configure epanet toolkit libary*
@@ -122,6 +169,14 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
         Datos importados:
         Nodos: *time *demand *head *pressure
         Líneas: *time *flow *velocity *headloss *status *setting *energy
+
+        Si se indica el archivo binario de resultados (.out) de una simulación 
+        previa, los resultados se leen de él sin simular. Las pérdidas de 
+        carga de las tuberías, guardadas por cada 1000 unidades de longitud, 
+        se convierten a pérdidas absolutas. El archivo no guarda la energía 
+        de las bombas en cada periodo, por lo que se estima con el rendimiento 
+        medio de cada bomba en la simulación.
+        Solo se importan los resultados entre los instantes inicial y final.
         
         Nota: Es necesario configurar el acceso a epanet de forma previa.
         Use Import/Configure epanet toolkit libary
@@ -137,7 +192,34 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
             QgsProcessingParameterFile(
                 self.INPUT,
                 self.tr('Epanet file'),
-                extension='inp'
+                extension='inp',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.BINARY_INPUT,
+                self.tr('Epanet binary output file (no simulation)'),
+                extension='out',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.START_TIME,
+                self.tr('Start time (h)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.0,
+                minValue=0.0
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.END_TIME,
+                self.tr('End time (h, 0 = end of simulation)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.0,
+                minValue=0.0
             )
         )
 
@@ -162,6 +244,12 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
 
         # INPUT
         epanet_file = self.parameterAsFile(parameters, self.INPUT, context)
+        binary_file = self.parameterAsFile(parameters, self.BINARY_INPUT,
+                                           context)
+        start = 3600*self.parameterAsDouble(parameters, self.START_TIME,
+                                            context)
+        end = 3600*self.parameterAsDouble(parameters, self.END_TIME, context)
+        end = end if end > 0 else None
 
         # DEFINE NODE LAYER
         newfields = QgsFields()
@@ -178,6 +266,7 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
             context,
             newfields
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
 
         # DEFINE LINK LAYER
         newfields = QgsFields()
@@ -195,10 +284,66 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
             context,
             newfields
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # SEND INFORMATION TO THE USER
         feedback.pushInfo('='*40)
 
+        # READ A BINARY OUTPUT FILE, WITHOUT SIMULATING
+        if binary_file:
+            feedback.pushInfo(f'Processing: {binary_file}')
+            try:
+                output = OutputFile(binary_file)
+            except Exception as error:
+                feedback.reportError('ERROR: {}'.format(error))
+                return {}
+            with output:
+                periods = output.periods(start, end)
+                times = output.times()
+                for done, period in enumerate(periods):
+                    time = strftime('%H:%M:%S', gmtime(times[period]))
+                    values = output.node_results[period, :3].T.tolist()
+                    for node_id, node_values in zip(output.node_ids, values):
+                        f = QgsFeature()
+                        f.setAttributes([time, node_id] + node_values)
+                        node_sink.addFeature(f)
+                    values = output.link_results[period].T.tolist()
+                    headlosses = output.headlosses(period).tolist()
+                    energies = output.power(period).tolist()
+                    for link_id, link_values, headloss, energy in zip(
+                            output.link_ids, values, headlosses, energies):
+                        flow, velocity, _, _, status, setting = \
+                            link_values[:6]
+                        if status >= OPEN_STATUS:
+                            status = 'OPEN'
+                        else:
+                            status = 'CLOSED'
+                        f = QgsFeature()
+                        f.setAttributes([time, link_id, flow, velocity,
+                                         headloss, status, setting,
+                                         energy])
+                        link_sink.addFeature(f)
+                    if feedback.isCanceled():
+                        break
+                    feedback.setProgress(100*(done+1)/len(periods))
+                msg = 'Results loaded successfully.'
+                feedback.pushInfo(msg)
+                msg = 'Reporting periods #: {}'.format(len(periods))
+                feedback.pushInfo(msg)
+                msg = 'Node #: {}'.format(output.nnodes)
+                feedback.pushInfo(msg)
+                msg = 'Link #: {}'.format(output.nlinks)
+                feedback.pushInfo(msg)
+            node_sink.close(feedback)
+            link_sink.close(feedback)
+            feedback.pushInfo('='*40)
+            if feedback.isCanceled():
+                return {}
+            return {self.NODE_OUTPUT: nodes_id, self.LINK_OUTPUT: links_id}
+        if not epanet_file:
+            feedback.reportError('ERROR: Set an epanet or a binary file!')
+            return {}
+
         # LOAD EPANET LIB SELECTING OS AND PLATFORM
         try:
             config = configparser.ConfigParser()
@@ -239,6 +384,16 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
             feedback.reportError('Epanet Toolkit error: {err}!')
             return {}
         link_count = count.value
+
+        # ELEMENT IDS, READ ONCE
+        err, node_ids = get_ids(epanet_lib, 'node', node_count)
+        if err:
+            feedback.reportError('Epanet Toolkit error: {err}!')
+            return {}
+        err, link_ids = get_ids(epanet_lib, 'link', link_count)
+        if err:
+            feedback.reportError('Epanet Toolkit error: {err}!')
+            return {}
         err = epanet_lib.ENopenH()
         if err:
             feedback.reportError('Epanet Toolkit error: {err}!')
@@ -254,65 +409,52 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
             current_time = ctypes.c_long()
             err = epanet_lib.ENrunH(ctypes.byref(current_time))
             time = strftime('%H:%M:%S', gmtime(current_time.value))
-            id_ = ctypes.create_string_buffer(MAX_LABEL_LEN)
-            variable = ctypes.c_float()
-
-            # NODE RESULT
-            for index in range(1, node_count + 1):
-                err = epanet_lib.ENgetnodeid(index, ctypes.byref(id_))
-                if err:
-                    feedback.reportError('Epanet Toolkit error: {err}!')
-                    return {}
-                node_result = [time, str(id_, encoding='utf-8')]
+            report = current_time.value >= start and (
+                end is None or current_time.value <= end)
+
+            # SKIP TIMES OUT OF THE WINDOW
+            if report:
+                # NODE RESULT
+                results = []
                 for parameter in [EN_DEMAND, EN_HEAD, EN_PRESSURE]:
-                    err = epanet_lib.ENgetnodevalue(index,
-                                                    parameter,
-                                                    ctypes.byref(variable)
-                                                    )
+                    err, values = get_values(epanet_lib, 'node', parameter,
+                                             node_count)
                     if err:
                         feedback.reportError('Epanet Toolkit error: {err}!')
                         return {}
-                    node_result.append(variable.value)
-                f = QgsFeature()
-                f.setAttributes(node_result)
-                node_sink.addFeature(f)
-
-            # LINK RESULT
-            for index in range(1, link_count + 1):
-                err = epanet_lib.ENgetlinkid(index, ctypes.byref(id_))
-                if err:
-                    feedback.reportError('Epanet Toolkit error: {err}!')
-                    return {}
-                link_result = [time, str(id_, encoding='utf-8')]
-                for parameter in [EN_FLOW, EN_VELOCITY, EN_HEADLOSS]:
-                    err = epanet_lib.ENgetlinkvalue(index,
-                                                    parameter,
-                                                    ctypes.byref(variable)
-                                                    )
-                    link_result.append(variable.value)
-                err = epanet_lib.ENgetlinkvalue(index,
-                                                EN_SETTING,
-                                                ctypes.byref(variable)
-                                                )
-                if err:
-                    feedback.reportError('Epanet Toolkit error: {err}!')
-                    return {}
-                if variable.value:
-                    link_result.append('OPEN')
-                else:
-                    link_result.append('CLOSED')
-                for parameter in [EN_SETTING, EN_ENERGY]:
-                    err = epanet_lib.ENgetlinkvalue(index,
-                                                    parameter,
-                                                    ctypes.byref(variable)
-                                                    )
+                    results.append(values)
+                for index, node_id in enumerate(node_ids):
+                    node_result = [time, node_id]
+                    node_result.extend(values[index] for values in results)
+                    f = QgsFeature()
+                    f.setAttributes(node_result)
+                    node_sink.addFeature(f)
+
+                # LINK RESULT
+                results = []
+                for parameter in [EN_FLOW, EN_VELOCITY, EN_HEADLOSS, EN_SETTING,
+                                  EN_ENERGY]:
+                    err, values = get_values(epanet_lib, 'link', parameter,
+                                             link_count)
                     if err:
                         feedback.reportError('Epanet Toolkit error: {err}!')
                         return {}
-                    link_result.append(variable.value)
-                f = QgsFeature()
-                f.setAttributes(link_result)
-                link_sink.addFeature(f)
+                    results.append(values)
+                flows, velocities, headlosses, settings, energies = results
+                for index, link_id in enumerate(link_ids):
+                    link_result = [time, link_id]
+                    link_result.append(flows[index])
+                    link_result.append(velocities[index])
+                    link_result.append(headlosses[index])
+                    if settings[index]:
+                        link_result.append('OPEN')
+                    else:
+                        link_result.append('CLOSED')
+                    link_result.append(settings[index])
+                    link_result.append(energies[index])
+                    f = QgsFeature()
+                    f.setAttributes(link_result)
+                    link_sink.addFeature(f)
 
             # END OF SIMULATON
             next_time = ctypes.c_long()
@@ -337,6 +479,8 @@ class ResultsFromEpanetAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo(msg)
         msg = 'Link #: {}'.format( link_count)
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
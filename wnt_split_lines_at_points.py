@@ -30,17 +30,21 @@ __copyright__ = '(C) 2019 by Andrés García Martínez'
 
 __revision__ = '$Format:%H$'
 
-from PyQt5.QtCore import QCoreApplication
-from qgis.core import (QgsGeometry,
+from PyQt5.QtCore import QCoreApplication, QVariant
+from qgis.core import (QgsFeature,
+                       QgsField,
+                       QgsFields,
+                       QgsGeometry,
                        QgsWkbTypes,
                        QgsPoint,
+                       QgsPointXY,
                        QgsProcessing,
                        QgsProcessingAlgorithm,
                        QgsProcessingParameterDistance,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterFeatureSink
                        )
-from . import utils_core as tools
+from .utils_features import BufferedSink
 from . import utils_split as split
 
 class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
@@ -53,6 +57,7 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
     LINE_INPUT = 'LINE_INPUT'
     TOLERANCE = 'TOLERANCE'
     OUTPUT = 'OUTPUT'
+    CLUSTER_OUTPUT = 'CLUSTER_OUTPUT'
 
     def tr(self, string):
         """
@@ -98,12 +103,18 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
         return self.tr('''Split lines at point positions.
         
         Tip: Use to add unions.
+
+        Points closer than the tolerance are merged. The merged clusters can
+        be saved to check which points collapsed together.
         
         ===
         
         Parte líneas en los puntos especificados.
         
         Sugerencia: Usar para añadir uniones.
+
+        Los puntos más próximos que la tolerancia se fusionan. Los grupos 
+        fusionados pueden guardarse para comprobar qué puntos se unieron.
         ''')
 
     def initAlgorithm(self, config=None):
@@ -143,6 +154,15 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
                 self.tr('Splitted line layer')
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.CLUSTER_OUTPUT,
+                self.tr('Merged point clusters'),
+                QgsProcessing.TypeVectorPoint,
+                optional=True,
+                createByDefault=False
+                )
+            )
 
     def processAlgorithm(self, parameters, context, feedback):
         """
@@ -174,63 +194,79 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             linlayer.sourceCrs()
             )
+        sink = BufferedSink(sink, 'Output layer')
 
         # LOAD AND FILTER OVERLAPPED POINTS
-        points = []
+        allpoints = []
+        fids = []
         for f in pntlayer.getFeatures():
             x, y = f.geometry().asPoint().x(), f.geometry().asPoint().y()
-            mindist = 1e24
-            for point in points:
-                mindist = min(mindist, tools.dist2p((x, y), point))
-            if mindist > tolerance:
-                points.append((x, y))
+            allpoints.append((x, y))
+            fids.append(f.id())
+        kept, clusters = split.merge_points(allpoints, tolerance)
+        points = [allpoints[index] for index in kept]
 
         # SHOW PROGRESS
         msg = 'Final splitting points: {}.'
         msg = msg.format(len(points))
         feedback.pushInfo(msg)
-        msg = 'Overlapped points: {}.'
-        msg = msg.format(pntlayer.featureCount() - len(points))
+        msg = 'Overlapped points: {} (clusters: {}).'
+        msg = msg.format(len(allpoints) - len(points), len(clusters))
         feedback.pushInfo(msg)
 
+        # WRITE MERGED CLUSTERS
+        fields = QgsFields()
+        fields.append(QgsField('cluster', QVariant.Int))
+        fields.append(QgsField('fid', QVariant.LongLong))
+        fields.append(QgsField('kept', QVariant.Int))
+        fields.append(QgsField('distance', QVariant.Double))
+        (cluster_sink, cluster_id) = self.parameterAsSink(
+            parameters,
+            self.CLUSTER_OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.Point,
+            pntlayer.sourceCrs()
+            )
+        cluster_sink = BufferedSink(cluster_sink, 'Cluster layer')
+        if cluster_sink:
+            for cnt, (index, merged) in enumerate(sorted(clusters.items())):
+                x0, y0 = allpoints[index]
+                for member in [index] + merged:
+                    x, y = allpoints[member]
+                    f = QgsFeature()
+                    f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+                    dist = ((x-x0)**2 + (y-y0)**2)**0.5
+                    f.setAttributes([cnt, fids[member], int(member == index),
+                                     dist])
+                    cluster_sink.addFeature(f)
+
+        # INDEX SPLITTING POINTS
+        splitter = split.LineSplitter(points, tolerance)
+
         # LOAD AND SPLIT LINES
         cnt = 0                         # link counter
         tot = linlayer.featureCount()
-        x1 = y1 = 1e24                   # initialize x boundbox
-        x2 = y2 = -1e24                  # initialize y boundbox
 
         # LINES LOOP
-        for f in linlayer.getFeatures():
+        for index, f in enumerate(linlayer.getFeatures()):
             line = []
             for vertex in f.geometry().asPolyline():
-                x, y = vertex.x(), vertex.y()
-                line.append((x, y))
-
-                # CALCULATE BOUNDBOX
-                x1, y1 = min(x1, x), min(y1, y)
-                x2, y2 = max(x2, x), max(y2, y)
-            x1, y1 = x1-tolerance, y1-tolerance
-            x2, y2 = x2+tolerance, y2+tolerance
-
-            # FILTER POINTS
-            fpoints = []
-            for point in points:
-                if x1 <= point[0] <= x2 and y1 <= point[1] <= y2:
-                    fpoints.append(point)
-           # SPLIT
-            if fpoints:
-                splitted = split.split_linestring_m(line, fpoints, tolerance)
-                if splitted:
-
-                    # ADD NEW LINESTRINGS
-                    for part in splitted:
-                        newpolyline = []
-                        for vertex in part:
-                            x, y = vertex[0:2]
-                            newpolyline.append(QgsPoint(x, y))
-                        f.setGeometry(QgsGeometry.fromPolyline(newpolyline))
-                        sink.addFeature(f)
-                        cnt += 1
+                line.append((vertex.x(), vertex.y()))
+
+            # SPLIT
+            splitted = splitter.split(line)
+            if len(splitted) > 1:
+
+                # ADD NEW LINESTRINGS
+                for part in splitted:
+                    newpolyline = []
+                    for vertex in part:
+                        x, y = vertex[0:2]
+                        newpolyline.append(QgsPoint(x, y))
+                    f.setGeometry(QgsGeometry.fromPolyline(newpolyline))
+                    sink.addFeature(f)
+                    cnt += 1
             else:
 
                 # KEEP ORIGINAL FEATURE
@@ -238,10 +274,14 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
                 cnt += 1
 
             # SHOW PROGRESS
-            feedback.setProgress(100*cnt/tot) # Update the progress bar
+            if feedback.isCanceled():
+                break
+            feedback.setProgress(100*(index+1)/tot) # Update the progress bar
 
         msg = 'Final line number: {} (over: {}).'
         feedback.pushInfo(msg.format(cnt, tot))
+        sink.close(feedback)
+        cluster_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
@@ -251,4 +291,6 @@ class SplitLinesAtPointsAlgorithm(QgsProcessingAlgorithm):
 
         # OUTPUT
 
+        if cluster_sink:
+            return {self.OUTPUT: dest_id, self.CLUSTER_OUTPUT: cluster_id}
         return {self.OUTPUT: dest_id}
@@ -36,6 +36,7 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterFeatureSource,
                        QgsWkbTypes
                       )
+from .utils_features import BufferedSink
 
 POS_TOLERANCE = 1e-4
 
@@ -175,6 +176,7 @@ class UpdateAssignmentAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             crs
             )
+        assign_sink = BufferedSink(assign_sink, 'Assignment layer')
         (target_sink, target_id) = self.parameterAsSink(
             parameters,
             self.TARGET_OUTPUT,
@@ -183,6 +185,7 @@ class UpdateAssignmentAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             crs
             )
+        target_sink = BufferedSink(target_sink, 'Target layer')
 
         # CHECK SOURCE POSITION AND READ SOURCE VALUES
         field_names = alayer.fields().names()
@@ -253,6 +256,8 @@ class UpdateAssignmentAlgorithm(QgsProcessingAlgorithm):
         feedback.pushInfo(f'Source #: {slayer.featureCount()}.')
         feedback.pushInfo(f'Target #: {tlayer.featureCount()}.')
         feedback.pushInfo(f'Assignment #: {alayer.featureCount()}.')
+        assign_sink.close(feedback)
+        target_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED
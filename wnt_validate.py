@@ -40,6 +40,7 @@ from qgis.core import (QgsField,
 
                        )
 from . import utils_core as tools
+from .utils_features import BufferedSink, attribute_rows
 
 class ValidateAlgorithm(QgsProcessingAlgorithm):
     """
@@ -168,6 +169,7 @@ class ValidateAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.Point,
             nodelay.sourceCrs()
             )
+        node_sink = BufferedSink(node_sink, 'Node layer')
         newfields = linklay.fields()
         newfields.append(QgsField("problems", QVariant.String))
         (link_sink, link_id) = self.parameterAsSink(
@@ -178,15 +180,16 @@ class ValidateAlgorithm(QgsProcessingAlgorithm):
             QgsWkbTypes.LineString,
             linklay.sourceCrs()
             )
+        link_sink = BufferedSink(link_sink, 'Link layer')
 
         # DEFINE NETWORK
         net = tools.WntNetwork()
 
         # LOAD NODES
         ncnt = 0
-        for f in nodelay.getFeatures():
+        for (nid,) in attribute_rows(nodelay, ['id']):
             ncnt += 1
-            net.add_node(tools.WntNode(f['id']))
+            net.add_node(tools.WntNode(nid))
 
             # SHOW PROGRESS
             if ncnt % 100 == 0:
@@ -194,9 +197,9 @@ class ValidateAlgorithm(QgsProcessingAlgorithm):
 
         # lOAD LINKS
         lcnt = 0
-        for f in linklay.getFeatures():
+        for lid, start, end in attribute_rows(linklay, ['id', 'start', 'end']):
             lcnt += 1
-            net.add_link(tools.WntLink(f['id'], f['start'], f['end']))
+            net.add_link(tools.WntLink(lid, start, end))
 
             # SHOW POROGRESS
             if lcnt % 100 == 0:
@@ -276,6 +279,8 @@ class ValidateAlgorithm(QgsProcessingAlgorithm):
         else:
             msg = "Network is valid."
         feedback.pushInfo(msg)
+        node_sink.close(feedback)
+        link_sink.close(feedback)
         feedback.pushInfo('='*40)
 
         # PROCCES CANCELED